@@ -1,8 +1,10 @@
 import ttkbootstrap as ttk
 import threading
+from tkinter import filedialog
 from gui.text_spinner import TextSpinner
 from scripts.get_census_tables import get_census_tables
 from scripts.extract_census_data import extract_census_data
+from scripts.import_offline_bundle import import_offline_bundle
 
 def create_extract_frame(parent, stop_event):
     frame = ttk.Frame(parent)
@@ -19,6 +21,10 @@ def create_extract_frame(parent, stop_event):
     status_label = ttk.Label(container, text="Ready to start...")
     status_label.pack(pady=5)
 
+    # Bytes received, speed and time left of the running downloads
+    transfer_label = ttk.Label(container, text="")
+    transfer_label.pack(pady=(0, 5))
+
     # Progress bar
     progress = ttk.Progressbar(container, orient="horizontal", length=300, mode="determinate")
     progress.pack(pady=10)
@@ -30,6 +36,10 @@ def create_extract_frame(parent, stop_event):
     # Start button
     start_btn = ttk.Button(container, text="Start Download")
     start_btn.pack(pady=10)
+
+    # Offline import button (table ZIPs copied from a USB drive)
+    offline_btn = ttk.Button(container, text="Import from Folder", bootstyle="secondary")
+    offline_btn.pack(pady=5)
     
     # Cancel button
     cancel_btn = ttk.Button(container, text="Cancel Download", bootstyle="danger")  # bright red
@@ -41,6 +51,7 @@ def create_extract_frame(parent, stop_event):
     def start_download():
         stop_event.clear() # Allow a new download
         start_btn.config(state="disabled")   # disable button
+        offline_btn.config(state="disabled")
         cancel_btn.config(state="normal")
         spinner.start()                      # start spinner
         status_label.config(text="Fetching latest census tables...")
@@ -51,6 +62,7 @@ def create_extract_frame(parent, stop_event):
             if stop_event.is_set():
                 spinner.stop()
                 start_btn.config(state="normal")
+                offline_btn.config(state="normal")
                 return
             
             result = get_census_tables(status_label=status_label)
@@ -61,6 +73,7 @@ def create_extract_frame(parent, stop_event):
                 progress['value'] = 0
                 spinner.stop()
                 start_btn.config(state="normal")
+                offline_btn.config(state="normal")
                 cancel_btn.config(state="disabled")
                 return
 
@@ -69,29 +82,60 @@ def create_extract_frame(parent, stop_event):
                 progress['value'] = 0
                 spinner.stop()
                 start_btn.config(state="normal")
+                offline_btn.config(state="normal")
                 cancel_btn.config(state="disabled")
                 return
 
             census_tables, year = result
-            extract_census_data(census_tables, year, progress, status_label, stop_event)
+            extract_census_data(census_tables, year, progress, status_label, stop_event, transfer_label=transfer_label)
 
             if not stop_event.is_set():
                 status_label.config(text="✅ All downloads complete!")
             spinner.stop()
             start_btn.config(state="normal")
+            offline_btn.config(state="normal")
+            cancel_btn.config(state="disabled")
+
+        threading.Thread(target=task, daemon=True).start()
+
+    # Offline import callback
+    def start_offline_import():
+        bundle_path = filedialog.askdirectory(title="Select the folder of downloaded StatCan tables")
+        if not bundle_path:
+            return
+
+        stop_event.clear() # Allow a new import
+        start_btn.config(state="disabled")
+        offline_btn.config(state="disabled")
+        cancel_btn.config(state="normal")
+        spinner.start()
+        progress['value'] = 0
+
+        def task():
+            result = import_offline_bundle(bundle_path, progressbar=progress, status_label=status_label, stop_event=stop_event,
+                                           transfer_label=transfer_label)
+
+            if result and not stop_event.is_set():
+                status_label.config(text="✅ All tables imported!")
+            spinner.stop()
+            start_btn.config(state="normal")
+            offline_btn.config(state="normal")
             cancel_btn.config(state="disabled")
 
         threading.Thread(target=task, daemon=True).start()
         
     def cancel_download():
         progress['value'] = 0
+        transfer_label.config(text="")
         stop_event.set()
         status_label.config(text="⚠️ Download cancelled by user")
         spinner.stop()  # if using spinner
         start_btn.config(state="normal")
+        offline_btn.config(state="normal")
         cancel_btn.config(state="disabled")
 
     start_btn.config(command=start_download)
+    offline_btn.config(command=start_offline_import)
     cancel_btn.config(command=cancel_download)
 
     return frame
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import time
+from tempfile import SpooledTemporaryFile
+from threading import Event
+
+# aiohttp is optional. It is only needed for headless batch runs using this engine
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from scripts.download_filtered_table import filter_table_zip
+from scripts.extract_census_data import DOWNLOAD_PLAN, GEO_FILTER
+from scripts.filter_csv_chunks import DEFAULT_CHUNK_ROWS
+from scripts.get_product_id import get_product_id_by_keyword, get_release_time
+from scripts.stream_download import DEFAULT_SPOOL_MAX_SIZE, DEFAULT_CHUNK_SIZE
+from utils.download_manifest import DownloadManifest
+from utils.get_data_path import get_data_path
+from utils.http_session import get_wds_url, MAX_RETRIES, RETRY_STATUS_CODES, POOL_SIZE, backoff_delay, rate_limiter, record_request
+from utils.raw_table_cache import RawTableCache, DEFAULT_CACHE_MAX_BYTES
+from utils.table_storage import TABLE_FORMATS, convert_table, resolve_format
+
+# Table ZIPs streamed at the same time. Requests are still capped by the shared rate limiter
+DEFAULT_MAX_CONCURRENCY = 8
+
+# How often stop_event is checked while waiting on the network
+STOP_POLL_INTERVAL = 0.1
+
+async def _request(session, method: str, url: str, timeout: int, **kwargs):
+    """
+    Sends a request with the same rate limit, retry/backoff and timing stats as utils.http_session.
+    The caller must release the returned response.
+    """
+    start = time.perf_counter()
+    attempt = 0
+
+    while True:
+        await rate_limiter.acquire_async()
+        response = None
+        try:
+            response = await session.request(method, url, timeout=aiohttp.ClientTimeout(total=None, sock_read=timeout, sock_connect=timeout), **kwargs)
+            if response.status not in RETRY_STATUS_CODES or attempt >= MAX_RETRIES:
+                record_request(url, time.perf_counter() - start, attempt, failed=response.status >= 400)
+                return response
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= MAX_RETRIES:
+                record_request(url, time.perf_counter() - start, attempt, failed=True)
+                raise
+
+        delay = backoff_delay(attempt, response.headers if response is not None else None)
+        if response is not None:
+            response.release()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+async def _stream_zip(session, url: str, timeout: int, spool_max_size: int, chunk_size: int):
+    """
+    Streams a ZIP into a spooled temporary file. The caller is responsible for closing it.
+
+    Returns:
+        tuple: (spooled file rewound to the start, ETag/Last-Modified of the ZIP for the download manifest)
+    """
+    spooled_file = SpooledTemporaryFile(max_size=spool_max_size, mode="w+b")
+    try:
+        response = await _request(session, "GET", url, timeout)
+        try:
+            response.raise_for_status()
+            validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+            async for chunk in response.content.iter_chunked(chunk_size):
+                spooled_file.write(chunk)
+        finally:
+            response.release()
+    except BaseException:
+        spooled_file.close()
+        raise
+
+    spooled_file.seek(0)
+    return spooled_file, validators
+
+async def _download_entry(session, semaphore, name: str, keyword: str, csv_filename: str, year: int, manifest: DownloadManifest,
+                          cache: RawTableCache, stop_event: Event, force: bool, timeout: int, spool_max_size: int, chunksize: int,
+                          storage_format: str) -> str:
+    """Downloads one table of the plan and returns the status text for it"""
+    # Catalog lookups read the CSV from disk, keep them off the event loop
+    product_id = await asyncio.to_thread(get_product_id_by_keyword, csv_filename, keyword, year=year)
+    if not product_id:
+        return f"⚠️ No match found for keyword: {keyword}"
+
+    filename = get_data_path(f"{name}_{year}.csv", f"data/{year}")
+    stored_path = os.path.splitext(filename)[0] + TABLE_FORMATS[storage_format]
+    release_time = await asyncio.to_thread(get_release_time, csv_filename, product_id)
+    if not force and manifest.is_fresh(product_id, release_time, stored_path, GEO_FILTER):
+        return f"⏭️ {name} is up to date"
+
+    result = {"success": False, "error": None, "details": None, "peak_memory": 0}
+    cached_path = cache.get(product_id, release_time) if cache else None
+
+    # Validators are recorded like extract_census_data does, so its next run can still skip with a conditional HEAD.
+    # A cached ZIP is the release the manifest already describes, so its stored validators still apply
+    if cached_path:
+        zip_buffer = open(cached_path, "rb")
+        entry = manifest.get(product_id) or {}
+        validators = manifest.get_validators(product_id) if entry.get("release_time") == release_time else {}
+    else:
+        async with semaphore:
+            # Step 1: Get CSV download JSON object
+            response = await _request(session, "GET", f"{get_wds_url()}/getFullTableDownloadCSV/{product_id}/en", timeout)
+            try:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            finally:
+                response.release()
+
+            # Step 2: Extract ZIP URL
+            zip_url = data.get("object")
+            if not zip_url:
+                return f"⚠️ Failed to download {name}: Missing 'object' field in StatCan response."
+
+            # Step 3: Stream the ZIP file
+            zip_buffer, validators = await _stream_zip(session, zip_url, timeout, spool_max_size, DEFAULT_CHUNK_SIZE)
+
+        if cache:
+            await asyncio.to_thread(cache.put, product_id, release_time, zip_buffer)
+
+    # Step 4-6: Parsing is CPU work, so it runs on a worker thread
+    with zip_buffer:
+        result = await asyncio.to_thread(filter_table_zip, zip_buffer, filename, GEO_FILTER, result, chunksize, stop_event)
+
+    if not result["success"]:
+        return f"⚠️ Failed to download {name}: {result['error']}"
+
+    await asyncio.to_thread(convert_table, filename, storage_format)
+    manifest.record(product_id, release_time, stored_path, GEO_FILTER, validators)
+    return f"✅ Downloaded {stored_path}"
+
+async def _watch_stop(stop_event: Event, tasks: list):
+    """Cancels every download task as soon as stop_event is set"""
+    while not stop_event.is_set():
+        await asyncio.sleep(STOP_POLL_INTERVAL)
+    for task in tasks:
+        task.cancel()
+
+async def download_census_years_async(jobs: list, stop_event: Event = None, status_callback=None, force: bool = False,
+                                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                                      timeout: int = 15, spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE, chunksize: int = DEFAULT_CHUNK_ROWS,
+                                      storage_format: str = "auto") -> dict:
+    """
+    Downloads the full download plan for one or more census years concurrently on a single event loop.
+    Pending and in-flight transfers are cancelled when stop_event is set.
+
+    Parameters:
+        jobs (list[tuple[str, int]]): (census tables CSV, year) pairs, as returned by get_census_tables/get_all_census_tables
+        stop_event (threading.Event, optional): Event to signal stopping the downloads
+        status_callback (callable, optional): Called with (year, name, status_text) as each table finishes
+        force (bool): Download every table even if the download manifest says it is up to date
+        max_concurrency (int): Number of table ZIPs streamed at the same time
+        cache_max_bytes (int): Disk budget for the raw table ZIP cache in data/cache. 0 disables the cache
+        timeout (int): Timeout in seconds for connecting and for each read
+        spool_max_size (int): Bytes of each streamed ZIP kept in memory before spilling to disk
+        chunksize (int): Rows parsed per chunk when filtering
+        storage_format (str): Format the filtered tables are saved in (see extract_census_data)
+
+    Returns:
+        dict: { year: { name: status_text } }. Tables cancelled by stop_event are missing
+    """
+    if aiohttp is None:
+        raise ImportError("The async download engine needs aiohttp (python -m pip install aiohttp)")
+
+    storage_format = resolve_format(storage_format)
+    stop_event = stop_event or Event()
+    manifest = DownloadManifest()
+    cache = RawTableCache(max_bytes=cache_max_bytes) if cache_max_bytes else None
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    statuses = {year: {} for _, year in jobs}
+
+    async def run_entry(csv_filename, year, name, keyword):
+        try:
+            status_text = await _download_entry(session, semaphore, name, keyword, csv_filename, year, manifest, cache,
+                                                stop_event, force, timeout, spool_max_size, chunksize, storage_format)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status_text = f"⚠️ Failed to download {name}: HTTP error: {e}"
+        except Exception as e:
+            status_text = f"⚠️ Failed to download {name}: Unexpected error: {e}"
+
+        statuses[year][name] = status_text
+        if status_callback:
+            status_callback(year, name, status_text)
+
+    connector = aiohttp.TCPConnector(limit=POOL_SIZE)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [
+            asyncio.create_task(run_entry(csv_filename, year, name, keyword))
+            for csv_filename, year in jobs
+            for name, keyword in DOWNLOAD_PLAN.items()
+        ]
+        watcher = asyncio.create_task(_watch_stop(stop_event, tasks))
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            watcher.cancel()
+
+    return statuses
+
+def run_async_download(jobs: list, **kwargs) -> dict:
+    """
+    Runs download_census_years_async from synchronous code (Ex: a headless batch script).
+    Takes the same arguments.
+
+    Example:
+        run_async_download([get_census_tables()])
+
+        # Backfill every available census year at once
+        run_async_download(get_all_census_tables())
+    """
+    return asyncio.run(download_census_years_async(jobs, **kwargs))
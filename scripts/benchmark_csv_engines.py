@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+from zipfile import ZipFile
+from scripts.download_filtered_table import filter_table_zip
+from scripts.filter_csv_chunks import DEFAULT_CHUNK_ROWS
+from utils.read_statcan_csv import measure_memory_savings, pyarrow
+
+def benchmark_csv_engines(zip_path: str, filters: dict, chunksize: int = DEFAULT_CHUNK_ROWS, repeat: int = 3) -> dict:
+    """
+    Times filtering a downloaded table ZIP with each available CSV engine, and measures the memory the lean reader
+    saves against a plain pd.read_csv on a sample of the table.
+    Useful on the largest cubes (Ex: field crops, cattle inventory) to check the pyarrow speedup on this machine.
+
+    Parameters:
+        zip_path (str): Path of a table ZIP (Ex: one from data/cache/objects)
+        filters (dict): Dictionary of filters (Ex: {"GEO": ["Alberta [PR480000000]"]})
+        chunksize (int): Rows parsed per chunk by the pandas engine. 0 loads the full table at once
+        repeat (int): Runs per engine, the fastest one is kept
+
+    Returns:
+        dict: {
+            "pandas": {"seconds": float, "peak_memory": int},
+            "pyarrow": {"seconds": float, "peak_memory": int},   # Only when pyarrow is installed
+            "speedup": float | None,                             # pandas seconds / pyarrow seconds
+            "memory_saved": float                                # Fraction of memory saved by the lean reader
+        }
+    """
+    engines = ["pandas"] + (["pyarrow"] if pyarrow is not None else [])
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        output_file = os.path.join(folder, "benchmark.csv")
+        for engine in engines:
+            best = None
+            for _ in range(max(1, repeat)):
+                result = {"success": False, "error": None, "details": None, "peak_memory": 0}
+                start = time.perf_counter()
+                with open(zip_path, "rb") as zip_buffer:
+                    result = filter_table_zip(zip_buffer, output_file, filters, result, chunksize=chunksize, csv_engine=engine)
+                elapsed = time.perf_counter() - start
+
+                if not result["success"]:
+                    raise RuntimeError(f"{engine} engine failed: {result['error']}")
+                if best is None or elapsed < best["seconds"]:
+                    best = {"seconds": elapsed, "peak_memory": result["peak_memory"]}
+            results[engine] = best
+
+    results["speedup"] = results["pandas"]["seconds"] / results["pyarrow"]["seconds"] if "pyarrow" in results else None
+
+    # Measured apart from the timed runs
+    with ZipFile(zip_path) as z:
+        csv_filename = next(f for f in z.namelist() if f.endswith(".csv") and "MetaData" not in f)
+        with z.open(csv_filename) as sample:
+            results["memory_saved"] = measure_memory_savings(sample)["saved_ratio"]
+    return results
@@ -0,0 +1,245 @@
+import requests
+import pandas as pd
+import itertools
+import threading
+from datetime import date
+from threading import Event
+from scripts.filter_csv_chunks import write_filtered_table
+from utils.get_data_path import get_data_path
+from utils.http_session import statcan_get, statcan_post, get_wds_url
+
+# Above this many cells the full table download is cheaper than asking for each cell
+MAX_COORDINATES = 3000
+
+# Number of coordinates sent per data point request
+COORDINATES_PER_REQUEST = 100
+
+# Coordinates always have 10 positions, unused dimensions are 0
+COORDINATE_POSITIONS = 10
+
+# Characters of refPer kept in REF_DATE for each WDS frequency code, as written in the full table CSV
+# (Ex: monthly "2021-05"), every other frequency (annual, census years, ...) is written as the year only
+REF_DATE_LENGTHS = {1: 10, 2: 10, 4: 10, 6: 7, 7: 7, 9: 7, 10: 7, 11: 7}
+
+# StatCan code sets (units of measure, status letters) rarely change so they are fetched once per run
+_code_sets = None
+_code_sets_lock = threading.Lock()
+
+def get_code_sets(timeout: int = 15) -> dict:
+    """
+    Returns the StatCan code sets used to translate data point codes into the text found in the CSV tables.
+
+    Returns:
+        dict: {
+            "uom": {code: "Unit text"},
+            "status": {code: "A"}
+        }
+    """
+    global _code_sets
+
+    with _code_sets_lock:
+        if _code_sets is None:
+            response = statcan_get(f"{get_wds_url()}/getCodeSets", timeout=timeout)
+            response.raise_for_status()
+            data = response.json().get("object", {})
+
+            _code_sets = {
+                "uom": {c.get("memberUomCode"): c.get("memberUomEn") for c in data.get("uom", [])},
+                "status": {c.get("statusCode"): c.get("statusRepresentation") for c in data.get("status", [])},
+            }
+    return _code_sets
+
+def get_cube_metadata(table_id: int, timeout: int = 15) -> dict:
+    """
+    Returns the getCubeMetadata object for a table (dimensions and their members).
+    """
+    response = statcan_post(f"{get_wds_url()}/getCubeMetadata", json=[{"productId": table_id}], timeout=timeout)
+    response.raise_for_status()
+    data = response.json()[0]
+
+    if data.get("status") != "SUCCESS":
+        raise ValueError(f"StatCan could not find metadata for table {table_id}")
+    return data["object"]
+
+def count_periods(metadata: dict):
+    """
+    Upper bound of the reference periods a cube holds, from its start/end dates (Ex: 2011 to 2021 → 121 months).
+    Counted in days for daily/weekly cubes and in months otherwise, so it is never below the real count whatever
+    the frequency. Asking for more periods than exist just returns all of them.
+
+    Returns:
+        int | None: Number of periods to request, or None if the metadata has no usable dates
+    """
+    try:
+        start = date.fromisoformat(str(metadata["cubeStartDate"])[:10])
+        end = date.fromisoformat(str(metadata["cubeEndDate"])[:10])
+    except (KeyError, ValueError):
+        return None
+    if end < start:
+        return None
+    if REF_DATE_LENGTHS.get(metadata.get("frequencyCode"), 4) == 10:
+        return (end - start).days + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+def _member_matches(member: dict, wanted: str) -> bool:
+    """Filter values are CSV text (Ex: "Alberta [PR480000000]"), members may or may not include the [code] part."""
+    name = member.get("memberNameEn") or ""
+    code = member.get("classificationCode")
+    return wanted in (name, f"{name} [{code}]") or wanted.split(" [")[0] == name
+
+def build_coordinates(metadata: dict, filters: dict):
+    """
+    Maps CSV column filters onto the table dimensions and lists every coordinate the filtered CSV would contain.
+
+    Parameters:
+        metadata (dict): Object returned by get_cube_metadata
+        filters (dict): Dictionary of filters (Ex: {"GEO": ["Alberta [PR480000000]"]})
+
+    Returns:
+        list[dict] | None: One dict per coordinate holding the coordinate string and the CSV column values,
+        or None if the filters cannot be mapped onto this table's coordinates.
+    """
+    dimensions = sorted(metadata.get("dimension", []), key=lambda d: d["dimensionPositionId"])
+    if not dimensions or len(dimensions) > COORDINATE_POSITIONS:
+        return None
+
+    # CSV files call the geography dimension GEO
+    column_names = ["GEO" if d["dimensionNameEn"] == "Geography" else d["dimensionNameEn"] for d in dimensions]
+    # Only plain {column: [values]} filters map onto members, richer expressions need the full table
+    if any(key not in column_names or not isinstance(value, list) for key, value in filters.items()):
+        return None
+
+    member_lists = []
+    for dimension, column in zip(dimensions, column_names):
+        members = dimension.get("member", [])
+        if column in filters:
+            # Keep the filter text so rows read exactly like the full table CSV
+            members = [
+                {**m, "csvName": wanted}
+                for wanted in filters[column]
+                for m in members
+                if _member_matches(m, wanted)
+            ]
+            if not members:
+                return None
+        member_lists.append(members)
+
+    total = 1
+    for members in member_lists:
+        total *= len(members)
+    if total == 0 or total > MAX_COORDINATES:
+        return None
+
+    coordinates = []
+    for combination in itertools.product(*member_lists):
+        ids = [str(m["memberId"]) for m in combination]
+        ids += ["0"] * (COORDINATE_POSITIONS - len(ids))
+
+        uom_code = next((m.get("memberUomCode") for m in combination if m.get("memberUomCode") is not None), None)
+        coordinates.append({
+            "coordinate": ".".join(ids),
+            "columns": {column: m.get("csvName", m.get("memberNameEn")) for column, m in zip(column_names, combination)},
+            "uom_code": uom_code,
+        })
+    return coordinates
+
+def download_data_points(table_id: int, output_file: str, filters: dict, stop_event: Event = None, timeout: int = 15,
+                         geo_outputs: dict = None) -> dict:
+    """
+    Downloads only the cells matching filters using the WDS coordinate endpoints instead of the full table,
+    and saves them with the same columns as download_filtered_table: the ones the lean reader keeps
+    (REF_DATE, GEO, the dimension columns, UOM, VALUE, STATUS, see read_statcan_csv).
+    Every reference period of each cell is requested (see count_periods) and rows are ordered by REF_DATE
+    like the full table CSV, so both engines save the same rows for the same table.
+    Can be safely stopped using stop_event.
+
+    Parameters:
+        table_id (int): StatCan table ID (Ex: 32100309) **WITHOUT VARIATION**
+        output_file (str): Name of output file
+        filters (dict): Dictionary of filters (Ex: {"GEO": ["Alberta"]})
+        stop_event (threading.Event, optional): Event to signal stopping the download
+        timeout (int): Timeout in seconds for HTTP requests
+        geo_outputs (dict, optional): {GEO value: output file} to save each geography to its own file.
+            output_file is ignored when given
+
+    Returns:
+        dict: {
+            "success": bool,
+            "mapped": bool,              # False if the filters have no coordinate mapping or no cell has data (use the full table instead)
+            "error": str | None,
+            "details": str | None,
+            "peak_memory": int
+        }
+    """
+    result = {"success": False, "mapped": False, "error": None, "details": None, "peak_memory": 0}
+
+    try:
+        # Step 1: Map the filters to coordinates
+        metadata = get_cube_metadata(table_id, timeout=timeout)
+        coordinates = build_coordinates(metadata, filters)
+        if coordinates is None:
+            result["details"] = "No coordinate mapping for filters."
+            return result
+        periods = count_periods(metadata)
+        if periods is None:
+            result["details"] = "No reference period range in the cube metadata."
+            return result
+        result["mapped"] = True
+
+        code_sets = get_code_sets(timeout=timeout)
+
+        # Step 2: Request every data point of each coordinate in batches
+        rows = []
+        for start in range(0, len(coordinates), COORDINATES_PER_REQUEST):
+            if stop_event and stop_event.is_set():
+                result["error"] = "Download stopped by user."
+                return result
+
+            batch = coordinates[start:start + COORDINATES_PER_REQUEST]
+            response = statcan_post(
+                f"{get_wds_url()}/getDataFromCubePidCoordAndLatestNPeriods",
+                json=[{"productId": table_id, "coordinate": c["coordinate"], "latestN": periods} for c in batch],
+                timeout=timeout,
+                stop_event=stop_event
+            )
+            response.raise_for_status()
+
+            for cell, entry in zip(batch, response.json()):
+                # Coordinates without data (Ex: suppressed combinations) are simply not in the full table either
+                if entry.get("status") != "SUCCESS":
+                    continue
+                obj = entry["object"]
+                for point in obj.get("vectorDataPoint", []):
+                    ref_length = REF_DATE_LENGTHS.get(point.get("frequencyCode"), 4)
+                    rows.append({
+                        "REF_DATE": str(point.get("refPer", ""))[:ref_length],
+                        **cell["columns"],
+                        "UOM": code_sets["uom"].get(cell["uom_code"]),
+                        "VALUE": point.get("value"),
+                        "STATUS": code_sets["status"].get(point.get("statusCode")) or None,
+                    })
+
+        # Every cell came back empty (Ex: coordinates that do not exist for this cube), let the full table decide
+        if not rows:
+            result["mapped"] = False
+            result["details"] = "No data points returned for the mapped coordinates."
+            return result
+
+        # Step 3: Save with the columns of the full table path
+        df = pd.DataFrame(rows).sort_values("REF_DATE", kind="stable")
+        write_filtered_table(df, get_data_path(output_file) if output_file else None, geo_outputs)
+        result["peak_memory"] = int(df.memory_usage(deep=True).sum())
+
+        result["success"] = True
+        return result
+
+    except requests.exceptions.Timeout:
+        result["error"] = "Request timed out."
+    except requests.exceptions.RequestException as e:
+        result["error"] = f"HTTP error: {e}"
+    except ValueError as e:
+        result["error"] = f"Failed to parse StatCan response: {e}"
+    except Exception as e:
+        result["error"] = f"Unexpected error: {e}"
+
+    return result
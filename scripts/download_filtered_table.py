@@ -1,105 +1,351 @@
 import requests
-import pandas as pd
 from io import BytesIO
 from zipfile import ZipFile
-import time
 from utils.get_data_path import get_data_path
 from threading import Event
+from scripts.stream_download import stream_download, resumable_download, DEFAULT_SPOOL_MAX_SIZE
+from scripts.filter_csv_chunks import filter_csv_chunks, write_filtered_table, DEFAULT_CHUNK_ROWS
+from scripts.download_data_points import download_data_points
+from utils.raw_table_cache import RawTableCache
+from utils.cancellation import CancellableReader
+from utils.dimension_index import parse_metadata_csv, save_dimension_index
+from utils.filter_expression import FilterExpression
+from utils.read_statcan_csv import read_statcan_csv, read_statcan_csv_arrow, resolve_csv_engine, measure_memory_savings, pyarrow
+from utils.http_session import statcan_get, statcan_head, get_wds_url
+from utils.transfer_progress import TransferProgress
 
-def download_filtered_table(table_id: int, output_file: str, filters: dict, stop_event: Event = None, timeout: int = 15) -> dict:
+def check_validators(url: str, validators: dict, timeout: int = 15):
+    """
+    Sends a conditional HEAD request for url using previously stored validators.
+    A HEAD the server rejects (Ex: 405) or that fails counts as changed, so the file is simply downloaded.
+
+    Returns:
+        tuple: (current validators dict, True if the file has not changed)
+    """
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        response = statcan_head(url, headers=headers, timeout=timeout, allow_redirects=True)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.exceptions.RequestException:
+        return {}, False
+
+    current = {
+        "etag": response.headers.get("ETag") or validators.get("etag"),
+        "last_modified": response.headers.get("Last-Modified") or validators.get("last_modified")
+    }
+
+    # Some servers ignore conditional headers on HEAD, so compare the validators directly too
+    unchanged = response.status_code == 304 or (
+        bool(headers)
+        and (not validators.get("etag") or response.headers.get("ETag") == validators["etag"])
+        and (not validators.get("last_modified") or response.headers.get("Last-Modified") == validators["last_modified"])
+    )
+    return current, unchanged
+
+def get_table_zip_url(table_id: int, result: dict, stop_event: Event = None, timeout: int = 15):
+    """
+    Requests the full table download link of a table.
+    Problems and stops are written into the download_filtered_table result dict.
+
+    Returns:
+        str | None: URL of the table ZIP, or None if there is none (check result for the reason)
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails
+    """
+    # Step 1: Get CSV download JSON object
+    url = f"{get_wds_url()}/getFullTableDownloadCSV/{table_id}/en"
+    response = statcan_get(url, timeout=timeout, stop_event=stop_event)
+    response.raise_for_status()
+
+    if stop_event and stop_event.is_set():
+        result["error"] = "Download stopped by user."
+        return None
+
+    data = response.json()
+
+    # Step 2: Extract ZIP URL
+    zip_url = data.get("object")
+    if not zip_url:
+        result["error"] = "Missing 'object' field in StatCan response."
+        result["details"] = f"Response JSON: {data}"
+        return None
+
+    if stop_event and stop_event.is_set():
+        result["error"] = "Download stopped by user."
+        return None
+    return zip_url
+
+def download_table_zip(table_id: int, result: dict, stop_event: Event = None, timeout: int = 15, stream: bool = True,
+                       spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE, validators: dict = None, resume: bool = True,
+                       progress: TransferProgress = None, zip_url: str = None):
+    """
+    Requests the full table download link and downloads the table ZIP.
+    Problems, stops and unchanged tables are written into the download_filtered_table result dict.
+    With stream and resume the ZIP goes straight to a file in data/partial, spool_max_size is only used
+    by the in-memory spool of stream without resume.
+    zip_url skips the link request when it is already known (see get_table_zip_url).
+
+    Returns:
+        file-like | None: The ZIP rewound to the start, or None if there is nothing to extract
+        (check result for the reason). The caller is responsible for closing it.
+
+    Raises:
+        requests.exceptions.RequestException: If a request fails
+    """
+    # Step 1-2: Get the ZIP URL
+    zip_url = zip_url or get_table_zip_url(table_id, result, stop_event=stop_event, timeout=timeout)
+    if not zip_url:
+        return None
+
+    # Step 2b: Skip the download if the ZIP has not changed since last time
+    if validators is not None:
+        result["validators"], result["not_modified"] = check_validators(zip_url, validators, timeout=timeout)
+        if result["not_modified"]:
+            result["success"] = True
+            return None
+
+    # Step 3: Download the ZIP file
+    if stream and resume:
+        zip_buffer = resumable_download(zip_url, timeout=timeout, stop_event=stop_event, progress=progress)
+        if zip_buffer is None:
+            result["error"] = "Download stopped by user."
+            return None
+    elif stream:
+        zip_buffer = stream_download(zip_url, timeout=timeout, stop_event=stop_event, spool_max_size=spool_max_size,
+                                     progress=progress)
+        if zip_buffer is None:
+            result["error"] = "Download stopped by user."
+            return None
+    else:
+        zip_file = statcan_get(zip_url, timeout=timeout, stop_event=stop_event)
+        zip_file.raise_for_status()
+        zip_buffer = BytesIO(zip_file.content)
+
+    return zip_buffer
+
+def filter_table_zip(zip_buffer, output_file: str, filters: dict, result: dict, chunksize: int = DEFAULT_CHUNK_ROWS,
+                     stop_event: Event = None, geo_outputs: dict = None, csv_engine: str = "auto",
+                     measure_memory: bool = False) -> dict:
+    """
+    Extracts the data CSV from a table ZIP, applies filters and saves the matching rows to output_file
+    (or to one file per geography when geo_outputs is given).
+    The dimensions and members listed in the ZIP's MetaData CSV are saved next to each output (see DimensionIndex).
+    Fills in and returns the download_filtered_table result dict. measure_memory also fills in "memory_saved",
+    at the cost of parsing a sample of the table twice more.
+    """
+    csv_engine = resolve_csv_engine(csv_engine)
+    if stop_event and stop_event.is_set():
+        result["error"] = "Download stopped by user."
+        return result
+
+    # Step 4: Extract CSV
+    with ZipFile(zip_buffer) as z:
+        csv_files = [f for f in z.namelist() if f.endswith(".csv") and "MetaData" not in f]
+        if not csv_files:
+            result["error"] = "No valid CSV found in ZIP."
+            result["details"] = f"Files in ZIP: {z.namelist()}"
+            return result
+        csv_filename = csv_files[0]
+        expression = FilterExpression(filters)
+        output_path = get_data_path(output_file) if output_file else None
+        output_paths = list(geo_outputs.values()) if geo_outputs else [output_path]
+
+        # The MetaData CSV is small, parse it up front into the dimension/member index
+        metadata_files = [f for f in z.namelist() if f.endswith("_MetaData.csv")]
+        metadata = None
+        if metadata_files:
+            with z.open(metadata_files[0]) as metadata_file:
+                metadata = parse_metadata_csv(metadata_file)
+
+        # Compare the lean reader against a plain load on a sample of the table
+        if measure_memory:
+            with z.open(csv_filename) as sample:
+                result["memory_saved"] = measure_memory_savings(sample)["saved_ratio"]
+
+        # Step 5/6: Filter chunk by chunk and append matches straight to the output file
+        if chunksize:
+            stats = filter_csv_chunks(z.open(csv_filename), output_path, expression, chunksize=chunksize, stop_event=stop_event,
+                                      geo_outputs=geo_outputs, csv_engine=csv_engine)
+            for key in stats["missing_columns"]:
+                result["details"] = (result["details"] or "") + f" Warning: Column '{key}' not found."
+            result["peak_memory"] = stats["peak_memory"]
+
+            if stats["stopped"]:
+                result["error"] = "Download stopped by user."
+                return result
+
+            if metadata:
+                save_dimension_index(metadata, output_paths)
+            result["success"] = True
+            return result
+
+        # Reads stop as soon as stop_event is set, instead of after the whole table is parsed
+        try:
+            with CancellableReader(z.open(csv_filename), stop_event) as csv_file:
+                if csv_engine == "pyarrow":
+                    table = read_statcan_csv_arrow(csv_file, keep_columns=expression.columns)
+                else:
+                    table = read_statcan_csv(csv_file, keep_columns=expression.columns)
+        except Exception:
+            if not (stop_event and stop_event.is_set()):
+                raise
+            result["error"] = "Download stopped by user."
+            return result
+
+    if stop_event and stop_event.is_set():
+        result["error"] = "Download stopped by user."
+        return result
+
+    # Step 5: Apply filters as a single mask. pyarrow tables are only converted to pandas once filtered
+    for key in expression.missing_columns(table):
+        result["details"] = (result["details"] or "") + f" Warning: Column '{key}' not found."
+    if csv_engine == "pyarrow":
+        df_filtered = table.filter(pyarrow.array(expression.mask(table))).to_pandas()
+        table_bytes = table.nbytes
+    else:
+        df_filtered = table[expression.mask(table)]
+        table_bytes = int(table.memory_usage(deep=True).sum())
+
+    if stop_event and stop_event.is_set():
+        result["error"] = "Download stopped by user."
+        return result
+
+    # Step 6: Save filtered results
+    write_filtered_table(df_filtered, output_path, geo_outputs)
+    if metadata:
+        save_dimension_index(metadata, output_paths)
+    result["peak_memory"] = table_bytes + int(df_filtered.memory_usage(deep=True).sum())
+
+    result["success"] = True
+    return result
+
+def download_filtered_table(table_id: int, output_file: str, filters: dict, stop_event: Event = None, timeout: int = 15,
+                            stream: bool = True, spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE,
+                            chunksize: int = DEFAULT_CHUNK_ROWS, engine: str = "auto", validators: dict = None,
+                            cache: RawTableCache = None, release: str = None, resume: bool = False,
+                            geo_outputs: dict = None, csv_engine: str = "auto", progress_callback=None,
+                            source_zip: str = None, measure_memory: bool = False) -> dict:
     """
     Downloads a table from Statistics Canada, extracts to CSV, applies filters, saves to data folder.
     Can be safely stopped using stop_event.
 
     Parameters:
         table_id (int): StatCan table ID (Ex: 32100309) **WITHOUT VARIATION**
-        output_file (str): Name of output file
-        filters (dict): Dictionary of filters (Ex: {"GEO": ["Alberta"]})
+        output_file (str | None): Name of output file. Not used when geo_outputs is given
+        filters (dict): Dictionary of filters (Ex: {"GEO": ["Alberta"]}). Also takes the richer conditions
+            of FilterExpression (Ex: {"GEO": {"regex": ", Alberta \\["}} for every census division in Alberta)
         stop_event (threading.Event, optional): Event to signal stopping the download
         timeout (int): Timeout in seconds for HTTP requests
+        stream (bool): Stream the ZIP to a spooled temp file instead of holding it in memory
+        spool_max_size (int): Bytes of the streamed ZIP kept in memory before spilling to disk.
+            Only used when stream is True and resume is False (the default), resumable downloads always go to data/partial
+        chunksize (int): Rows parsed per chunk when filtering. 0/None loads the full table at once
+        engine (str): How the data is fetched
+            "full"       → Always download the full table ZIP
+            "coordinate" → Only fetch the filtered cells through the WDS coordinate endpoints
+            "auto"       → Try "coordinate" and fall back to "full" when the filters have no coordinate mapping,
+                           no cell has data or the coordinate requests fail
+        validators (dict, optional): ETag/Last-Modified from a previous download ({"etag": ..., "last_modified": ...}).
+            When given, the ZIP is only downloaded if it changed, and the new validators are returned
+        cache (RawTableCache, optional): Cache of raw ZIPs to read from and save downloads to
+        release (str, optional): Release of the table (Ex: its releaseTime), used as the cache key
+        resume (bool): Keep interrupted ZIP downloads in data/partial, even when stopped, and resume them with
+            Range requests. Only used when stream is True. Off by default so small ZIPs stay in memory (see spool_max_size)
+        geo_outputs (dict, optional): {GEO value: output file}. Scans the table once and writes each
+            geography to its own file (Ex: {"Alberta [PR480000000]": "alberta.csv", "Ontario [PR350000000]": "ontario.csv"})
+        csv_engine (str): How the extracted CSV is parsed
+            "pandas"  → pandas C parser (single-threaded)
+            "pyarrow" → pyarrow's multithreaded parser, rows are filtered before converting to pandas
+            "auto"    → "pyarrow" when it is installed, otherwise "pandas"
+        progress_callback (callable, optional): Called with a progress dict (stage, bytes, total, rate, eta) while
+            the ZIP streams in, at most every PROGRESS_INTERVAL seconds, and when filtering starts (see TransferProgress)
+        source_zip (str, optional): Path of an already downloaded table ZIP (Ex: from an offline bundle).
+            Nothing is fetched from StatCan, the ZIP is only filtered
+        measure_memory (bool): Also compare the lean reader against a plain pd.read_csv on a sample of the table
+            (fills in "memory_saved"). Off by default since it parses the sample twice more
 
     Returns:
         dict: {
             "success": bool,
             "error": str | None,
-            "details": str | None
+            "details": str | None,
+            "peak_memory": int,          # Estimated peak bytes held by the table data
+            "memory_saved": float,       # Fraction of memory saved by the lean reader against a plain pd.read_csv (0.0 unless measure_memory)
+            "not_modified": bool,        # True if validators showed the table has not changed
+            "validators": dict,          # ETag/Last-Modified of the downloaded ZIP
+            "from_cache": bool           # True if the ZIP was read from the raw table cache
         }
     """
-    result = {"success": False, "error": None, "details": None}
+    result = {"success": False, "error": None, "details": None, "peak_memory": 0, "memory_saved": 0.0, "not_modified": False,
+              "validators": {}, "from_cache": False}
 
-    try:
-        # Early exit if stop requested
-        if stop_event and stop_event.is_set():
-            result["error"] = "Download stopped by user."
-            return result
-
-        # Step 1: Get CSV download JSON object
-        url = f"https://www150.statcan.gc.ca/t1/wds/rest/getFullTableDownloadCSV/{table_id}/en"
-        response = requests.get(url, timeout=timeout)
-        response.raise_for_status()
-        time.sleep(0.04)
+    progress = TransferProgress(progress_callback) if progress_callback else None
 
-        if stop_event and stop_event.is_set():
-            result["error"] = "Download stopped by user."
-            return result
-
-        data = response.json()
-
-        # Step 2: Extract ZIP URL
-        zip_url = data.get("object")
-        if not zip_url:
-            result["error"] = "Missing 'object' field in StatCan response."
-            result["details"] = f"Response JSON: {data}"
-            return result
+    # Every requested geography has to survive the GEO filter
+    if geo_outputs:
+        filters = {**filters, "GEO": list(geo_outputs)}
 
+    try:
+        # Early exit if stop requested
         if stop_event and stop_event.is_set():
             result["error"] = "Download stopped by user."
             return result
 
-        # Step 3: Download the ZIP file
-        zip_file = requests.get(zip_url, timeout=timeout)
-        zip_file.raise_for_status()
-        time.sleep(0.04)
+        # A local ZIP is read just like a cached one
+        cached_path = source_zip or (cache.get(table_id, release) if cache else None)
 
-        if stop_event and stop_event.is_set():
-            result["error"] = "Download stopped by user."
-            return result
+        # Step 0: Fetch just the filtered cells when possible. A cached ZIP is still cheaper to filter locally
+        zip_url = None
+        if engine in ("auto", "coordinate") and not cached_path:
+            # The cells come from the same release as the ZIP, so its validators tell whether anything changed.
+            # Without stored validators (Ex: first download) there is nothing to compare, so no request is spent on it
+            if validators and (validators.get("etag") or validators.get("last_modified")):
+                zip_url = get_table_zip_url(table_id, result, stop_event=stop_event, timeout=timeout)
+                if not zip_url:
+                    return result
+                result["validators"], result["not_modified"] = check_validators(zip_url, validators, timeout=timeout)
+                if result["not_modified"]:
+                    result["success"] = True
+                    return result
+                # Already checked, a fallback to the full ZIP downloads it without asking again
+                validators = None
 
-        # Step 4: Extract CSV
-        with ZipFile(BytesIO(zip_file.content)) as z:
-            csv_files = [f for f in z.namelist() if f.endswith(".csv") and "MetaData" not in f]
-            if not csv_files:
-                result["error"] = "No valid CSV found in ZIP."
-                result["details"] = f"Files in ZIP: {z.namelist()}"
+            point_result = download_data_points(table_id, output_file, filters, stop_event=stop_event, timeout=timeout,
+                                                geo_outputs=geo_outputs)
+            mapped = point_result.pop("mapped")
+            stopped = stop_event is not None and stop_event.is_set()
+            # In auto mode a failed coordinate fetch (Ex: timeout, HTTP error) is retried with the full ZIP
+            if engine == "coordinate" or (mapped and point_result["success"]) or stopped:
+                # Keep the not_modified/validators keys callers rely on
+                result.update(point_result)
                 return result
-            csv_filename = csv_files[0]
-            df = pd.read_csv(z.open(csv_filename))
 
-        if stop_event and stop_event.is_set():
-            result["error"] = "Download stopped by user."
-            return result
-
-        # Step 5: Apply filters
-        df_filtered = df.copy()
-        for key, value in filters.items():
-            if stop_event and stop_event.is_set():
-                result["error"] = "Download stopped by user."
+        # Step 1-3: Use the cached ZIP of this release, or download it
+        if cached_path:
+            zip_buffer = open(cached_path, "rb")
+            result["from_cache"] = not source_zip
+        else:
+            zip_buffer = download_table_zip(table_id, result, stop_event=stop_event, timeout=timeout, stream=stream,
+                                            spool_max_size=spool_max_size, validators=validators, resume=resume,
+                                            progress=progress, zip_url=zip_url)
+            if zip_buffer is None:
                 return result
-            if key not in df_filtered.columns:
-                result["details"] = (result["details"] or "") + f" Warning: Column '{key}' not found."
-                continue
-            df_filtered = df_filtered[df_filtered[key].isin(value)]
-
-        if stop_event and stop_event.is_set():
-            result["error"] = "Download stopped by user."
-            return result
+            if cache:
+                cache.put(table_id, release, zip_buffer)
 
-        # Step 6: Save filtered results
-        output_path = get_data_path(output_file)
-        df_filtered.to_csv(output_path, index=False)
-
-        result["success"] = True
-        return result
+        # Step 4-6: Extract the CSV, filter it and save the results
+        if progress:
+            progress.set_stage("filtering")
+        with zip_buffer:
+            return filter_table_zip(zip_buffer, output_file, filters, result, chunksize=chunksize, stop_event=stop_event,
+                                    geo_outputs=geo_outputs, csv_engine=csv_engine, measure_memory=measure_memory)
 
     except requests.exceptions.Timeout:
         result["error"] = "Request timed out."
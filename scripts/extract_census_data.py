@@ -1,91 +1,270 @@
 from scripts.download_filtered_table import download_filtered_table
-from scripts.get_product_id import get_product_id_by_keyword
+from scripts.get_product_id import load_catalog
 from utils.get_data_path import get_data_path
+from utils.download_manifest import DownloadManifest
+from utils.raw_table_cache import RawTableCache, DEFAULT_CACHE_MAX_BYTES
+from utils.format_bytes import format_bytes
+from utils.table_storage import TABLE_FORMATS, convert_table, resolve_format
+from utils.transfer_progress import PROGRESS_INTERVAL, format_progress
+from utils.cancellation import CANCEL_POLL_INTERVAL, get_cancel_latency
 import pandas as pd
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def extract_census_data(csv_filename, year: int, progressbar=None, status_label=None, stop_event=None):
-    """
-    Retrieves all data from the tables
+# Tables downloaded at the same time. Requests are still capped by the shared rate limiter
+DEFAULT_MAX_WORKERS = 4
+
+GEO_FILTER = {"GEO": ["Alberta [PR480000000]"]}
+
+# --- Census of Agriculture Tables to be Downloaded ---
+# Structure: "file_name": "keywords used to find file"
+DOWNLOAD_PLAN = {
+    # Farm classifications
+    "farm_type": "farm type",
+    "total_farm_area": "total farm area",
+    "land_tenure": "land tenure",
+    "operating_arrangement": "operating arrangement",
+    "direct_sales": "direct sales",
+    "paid_labour": "paid labour",
+    "succession_plan": "succession plan",
     
-    TODO Write documentation for this function
+    # I am not confident these tables are useless but data is currently not being extracted from them
+    # "farm_capital": "farm capital",
+    # "operating_revenues": "operating revenues",
+    # "operating_expenses": "operating expenses"
+
+    # Land & crops
+    "land_use": "land use",
+    "field_crops": "field crops",
+    "fruits": "fruits",
+    "greenhouse_products": "greenhouse products",
+    "land_inputs": "manure and irrigation",
+
+    # Livestock & poultry
+    "cattle_inventory": "cattle inventory",
+    "sheep_inventory": "sheep inventory",
+    "pig_inventory": "pig inventory",
+    "other_livestock": "other livestock inventories",
+    "poultry_inventory": "poultry inventories",
+    "egg_production": "egg production",
+    "bees": "bees",
+
+    # Tech & energy
+    "renewable_energy": "renewable energy production",
+
+    # Operators
+    "farm_operators_age_sex": "age, sex and number of operators",
+    "farm_operators_work": "farm work and other paid work"
+}
+
+def get_geo_output_path(name: str, year: int, geo: str) -> str:
     """
-    geo_filter = {"GEO": ["Alberta [PR480000000]"]}
-    
-    # --- Census of Agriculture Tables to be Downloaded ---
-    # Structure: "file_name": "keywords used to find file"
-    download_plan = {
-        # Farm classifications
-        "farm_type": "farm type",
-        "total_farm_area": "total farm area",
-        "land_tenure": "land tenure",
-        "operating_arrangement": "operating arrangement",
-        "direct_sales": "direct sales",
-        "paid_labour": "paid labour",
-        "succession_plan": "succession plan",
-        
-        # I am not confident these tables are useless but data is currently not being extracted from them
-        # "farm_capital": "farm capital",
-        # "operating_revenues": "operating revenues",
-        # "operating_expenses": "operating expenses"
-
-        # Land & crops
-        "land_use": "land use",
-        "field_crops": "field crops",
-        "fruits": "fruits",
-        "greenhouse_products": "greenhouse products",
-        "land_inputs": "manure and irrigation",
-
-        # Livestock & poultry
-        "cattle_inventory": "cattle inventory",
-        "sheep_inventory": "sheep inventory",
-        "pig_inventory": "pig inventory",
-        "other_livestock": "other livestock inventories",
-        "poultry_inventory": "poultry inventories",
-        "egg_production": "egg production",
-        "bees": "bees",
-
-        # Tech & energy
-        "renewable_energy": "renewable energy production",
-
-        # Operators
-        "farm_operators_age_sex": "age, sex and number of operators",
-        "farm_operators_work": "farm work and other paid work"
-    }
+    Returns where a table filtered to one geography is saved.
+    The default geography (Alberta) stays in data/<year>/ where get_statcan_value looks by default.
+    Other geographies go to data/geo/<code>/<year>/ (Ex: "Medicine Hat, Alberta [CD4801]" → data/geo/CD4801/2021/),
+    readable with get_statcan_value(..., data_folder="data/geo/<code>").
+    """
+    if geo in GEO_FILTER["GEO"]:
+        return get_data_path(f"{name}_{year}.csv", f"data/{year}")
+
+    # Prefer the StatCan code in brackets, otherwise a filesystem safe version of the name
+    match = re.search(r"\[([^\]]+)\]", geo)
+    code = match.group(1) if match else re.sub(r"[^\w]+", "_", geo).strip("_")
+    return get_data_path(f"{name}_{year}.csv", f"data/geo/{code}/{year}")
+
+def summarize_transfers(transfers: dict) -> str:
+    """
+    Combines the progress of the tables currently being worked on into one status line
+    (Ex: "⬇️ 2 downloads: 45.2 MB of 300.0 MB at 3.1 MB/s, 1m 25s left | 🔎 Filtering field_crops").
+    Shows whether time is going into StatCan transfers or into parsing.
+
+    Parameters:
+        transfers (dict): { table name: progress dict from TransferProgress }
+    """
+    downloads = [p for p in transfers.values() if p["stage"] == "downloading"]
+    filtering = sorted(name for name, p in transfers.items() if p["stage"] == "filtering")
+    parts = []
+
+    if downloads:
+        combined = {"bytes": sum(p["bytes"] for p in downloads), "rate": sum(p["rate"] for p in downloads), "total": None, "eta": None}
+        # Totals and ETAs only add up when every server sent a size
+        if all(p["total"] for p in downloads):
+            combined["total"] = sum(p["total"] for p in downloads)
+            if combined["rate"] > 0:
+                combined["eta"] = max(combined["total"] - combined["bytes"], 0) / combined["rate"]
+        label = "1 download" if len(downloads) == 1 else f"{len(downloads)} downloads"
+        parts.append(f"⬇️ {label}: {format_progress(combined)}")
+    if filtering:
+        parts.append(f"🔎 Filtering {', '.join(filtering)}")
+    return " | ".join(parts)
+
+def extract_census_data(csv_filename, year: int, progressbar=None, status_label=None, stop_event=None, engine: str = "auto",
+                        force: bool = False, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES, max_workers: int = DEFAULT_MAX_WORKERS,
+                        geographies: list = None, storage_format: str = "auto", transfer_label=None, bundle: dict = None):
+    """
+    Downloads every table in the download plan for the given census year, filtered to Alberta,
+    into data/<year>/<name>_<year>.<format>. Can be safely stopped using stop_event.
+
+    When several geographies are given each table is still scanned only once, and every
+    geography gets its own file (see get_geo_output_path).
+
+    Parameters:
+        csv_filename (str): Path to the agriculture_census_tables_<year>.csv catalog
+        year (int): Census year being downloaded
+        progressbar (ttk.Progressbar, optional): Updated as each table completes
+        status_label (ttk.Label, optional): Shows the status of each table
+        stop_event (threading.Event, optional): Event to signal stopping the download
+        engine (str): Fetch engine passed to download_filtered_table ("auto", "coordinate" or "full")
+        force (bool): Download every table even if the download manifest says it is up to date
+        cache_max_bytes (int): Disk budget for the raw table ZIP cache in data/cache. 0 disables the cache
+        max_workers (int): Number of tables downloaded at the same time
+        geographies (list[str], optional): GEO values to extract (Ex: ["Alberta [PR480000000]", "Medicine Hat, Alberta [CD4801]"]).
+            Defaults to GEO_FILTER
+        storage_format (str): Format the filtered tables are saved in ("auto", "feather", "parquet", "pickle" or "csv").
+            "auto" uses feather when pyarrow is installed, otherwise pickle
+        transfer_label (ttk.Label, optional): Shows bytes received, MB/s and ETA of the running downloads,
+            refreshed every PROGRESS_INTERVAL seconds
+        bundle (dict, optional): { product ID: path of a downloaded table ZIP }. Offline mode: the tables are filtered
+            from these ZIPs and nothing is fetched from StatCan (see import_offline_bundle)
+    """
+    storage_format = resolve_format(storage_format)
+    geographies = list(geographies or GEO_FILTER["GEO"])
+    geo_filter = {"GEO": geographies}
+    download_plan = DOWNLOAD_PLAN
 
     total = len(download_plan)
     completed = 0
+    manifest = DownloadManifest()
+    cache = RawTableCache(max_bytes=cache_max_bytes) if cache_max_bytes else None
+
+    # Every keyword of the plan is ranked against the catalog up front, with one read of the CSV.
+    # catalog.explain(keyword, year) shows why a table was picked
+    catalog = load_catalog(csv_filename)
+    candidates = catalog.resolve(download_plan.values(), year=year)
+
+    # Latest progress of each table being worked on, written by the worker threads
+    transfers = {}
 
-    for name, keyword in download_plan.items():
-        # Check if user requested stop
+    def process_entry(name, keyword):
+        """Downloads one table of the plan and returns the status text to show for it"""
+        # Skip work queued before the user requested stop
         if stop_event and stop_event.is_set():
-            if progressbar:
-                progressbar['value'] = 0
-            if status_label:
-                status_label.config(text="⚠️ Download stopped by user")
-            return
-        
-        product_id = get_product_id_by_keyword(csv_filename, keyword)
-        if product_id:
-            filename = get_data_path(f"{name}_{year}.csv", f"data/{year}")
-            
-            # Check again before starting a potentially long download
-            if stop_event and stop_event.is_set():
-                if status_label:
-                    status_label.config(text="⚠️ Download stopped by user")
-                return
-            
-            download_filtered_table(product_id, filename, geo_filter, stop_event=stop_event)
-            status_text = f"✅ Downloaded {filename}"
+            return None
+
+        if not candidates[keyword]:
+            return f"⚠️ No match found for keyword: {keyword}"
+        product_id = candidates[keyword][0]["productId"]
+
+        geo_outputs = {geo: get_geo_output_path(name, year, geo) for geo in geographies}
+
+        # Tables are downloaded as CSV and then converted, the manifest tracks the converted files
+        stored_paths = [os.path.splitext(path)[0] + TABLE_FORMATS[storage_format] for path in geo_outputs.values()]
+        if len(geo_outputs) == 1:
+            download_file = next(iter(geo_outputs.values()))
+            filename = stored_paths[0]
+            geo_outputs = None
         else:
-            status_text = f"⚠️ No match found for keyword: {keyword}"
-        
-        completed += 1
-        percent = int((completed / total) * 100)
-        
-        # update UI if widgets were passed
+            download_file = None
+            filename = stored_paths
+
+        # Skip tables StatCan has not republished since the last download
+        release_time = catalog.get_release_time(product_id)
+        if not force and manifest.is_fresh(product_id, release_time, filename, geo_filter):
+            return f"⏭️ {name} is up to date"
+
+        # Offline mode filters the table ZIP from the bundle instead of fetching it
+        source_zip = None
+        if bundle is not None:
+            source_zip = bundle.get(int(product_id))
+            if not source_zip:
+                return f"⚠️ {name}: table {product_id} is not in the offline bundle"
+
+        # Validators only help if the existing file was made with the same filters
+        can_skip = not force and manifest.matches(product_id, filename, geo_filter)
+        validators = manifest.get_validators(product_id) if can_skip else {}
+
+        def on_progress(progress):
+            transfers[name] = progress
+
+        # Census ZIPs can be hundreds of MB, so interrupted downloads are kept in data/partial and resumed next run
+        try:
+            result = download_filtered_table(product_id, download_file, geo_filter, stop_event=stop_event, engine=engine,
+                                             validators=validators, cache=cache, release=release_time, resume=True,
+                                             geo_outputs=geo_outputs, progress_callback=on_progress, source_zip=source_zip)
+        finally:
+            transfers.pop(name, None)
+        if not result["success"]:
+            return f"⚠️ Failed to download {name}: {result['error']}"
+
+        if not result["not_modified"]:
+            for path in (geo_outputs.values() if geo_outputs else [download_file]):
+                convert_table(path, storage_format)
+
+        manifest.record(product_id, release_time, filename, geo_filter, result["validators"])
+        saved = f"{name} for {len(geo_outputs)} geographies" if geo_outputs else filename
+        if result["not_modified"]:
+            return f"⏭️ {name} is up to date"
+
+        memory = f"peak memory {format_bytes(result['peak_memory'])}"
+        if source_zip:
+            return f"✅ Imported {saved} from the offline bundle ({memory})"
+        if result["from_cache"]:
+            return f"✅ Filtered {saved} from cache ({memory})"
+        return f"✅ Downloaded {saved} ({memory})"
+
+    def download_entry(name, keyword):
+        """process_entry that never raises, so one failing table (Ex: a disk error while converting) shows as a status"""
+        try:
+            return process_entry(name, keyword)
+        except Exception as e:
+            return f"⚠️ Failed to download {name}: {e}"
+
+    # Tables download in parallel; the shared rate limiter in utils.http_session keeps
+    # the combined request rate within StatCan's limits. UI updates stay on this thread
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(download_entry, name, keyword) for name, keyword in download_plan.items()]
+        pending = set(futures)
+        last_refresh = 0.0
+
+        while pending:
+            # Wake up regularly to notice a stop and refresh the transfer progress, not only when a table finishes
+            done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+            # Check if user requested stop. Leaving the executor waits for running tables to abort
+            if stop_event and stop_event.is_set():
+                for f in futures:
+                    f.cancel()
+                break
+
+            if transfer_label and time.monotonic() - last_refresh >= PROGRESS_INTERVAL:
+                last_refresh = time.monotonic()
+                transfer_label.config(text=summarize_transfers(dict(transfers)))
+                transfer_label.update_idletasks()
+
+            for future in done:
+                status_text = future.result()
+                completed += 1
+                percent = int((completed / total) * 100)
+
+                # update UI if widgets were passed
+                if progressbar:
+                    progressbar['value'] = percent
+                    progressbar.update_idletasks()
+                # None means the table was skipped after a stop, there is nothing to show
+                if status_label and status_text is not None:
+                    status_label.config(text=status_text)
+                    status_label.update_idletasks()
+
+    if transfer_label:
+        transfer_label.config(text="")
+
+    if stop_event and stop_event.is_set():
+        # Time from the cancel to every transfer and parse having stopped (only known for a StopEvent)
+        latency = get_cancel_latency(stop_event)
         if progressbar:
-            progressbar['value'] = percent
-            progressbar.update_idletasks()
+            progressbar['value'] = 0
         if status_label:
-            status_label.config(text=status_text)
-            status_label.update_idletasks()
+            stopped_in = f" (stopped in {latency * 1000:.0f} ms)" if latency is not None else ""
+            status_label.config(text=f"⚠️ Download stopped by user{stopped_in}")
@@ -0,0 +1,174 @@
+import os
+import pandas as pd
+from contextlib import closing
+from threading import Event
+from utils.cancellation import CancellableReader
+from utils.filter_expression import FilterExpression
+from utils.read_statcan_csv import read_statcan_csv, read_statcan_csv_arrow, resolve_csv_engine, pyarrow
+from utils.table_storage import commit_table, partial_path
+
+# Rows parsed per chunk. Keeps peak memory roughly constant regardless of table size
+DEFAULT_CHUNK_ROWS = 100_000
+
+def write_filtered_rows(df: pd.DataFrame, output_path: str, geo_outputs: dict = None, first_chunk: bool = True) -> dict:
+    """
+    Writes filtered rows to output_path, or splits them into one file per geography when geo_outputs is given.
+    The first chunk overwrites the file(s) and writes the header, later chunks are appended.
+
+    Parameters:
+        df (pd.DataFrame): Filtered rows
+        output_path (str): File the rows are written to. Ignored when geo_outputs is given
+        geo_outputs (dict, optional): {GEO value: output path}
+        first_chunk (bool): True for the first (or only) piece of the table
+
+    Returns:
+        dict: {output path: rows written to it}
+    """
+    mode = "w" if first_chunk else "a"
+
+    if not geo_outputs:
+        df.to_csv(output_path, mode=mode, header=first_chunk, index=False)
+        return {output_path: len(df)}
+
+    # One groupby pass instead of one scan per geography
+    groups = dict(tuple(df.groupby("GEO", sort=False, observed=True))) if "GEO" in df.columns else {}
+    written = {}
+    for geo, path in geo_outputs.items():
+        rows = groups.get(geo, df.iloc[0:0])
+        if first_chunk or not rows.empty:
+            rows.to_csv(path, mode=mode, header=first_chunk, index=False)
+        written[path] = len(rows)
+    return written
+
+class FilteredOutputs:
+    """
+    Output file(s) of a filtered table while it is being written.
+    Rows go to partial files and only replace the final files in commit(), once every row is on disk,
+    so a crash or stop halfway leaves the previous complete files untouched.
+    """
+    def __init__(self, output_path: str, geo_outputs: dict = None):
+        self.final_paths = list(geo_outputs.values()) if geo_outputs else [output_path]
+        self.output_path = partial_path(output_path) if output_path and not geo_outputs else None
+        self.geo_outputs = {geo: partial_path(path) for geo, path in geo_outputs.items()} if geo_outputs else None
+        self.rows = {}
+
+    def write(self, df: pd.DataFrame, first_chunk: bool = True):
+        for path, rows in write_filtered_rows(df, self.output_path, self.geo_outputs, first_chunk).items():
+            self.rows[path] = self.rows.get(path, 0) + rows
+
+    def commit(self):
+        for path in self.final_paths:
+            commit_table(partial_path(path), path, self.rows.get(partial_path(path), 0))
+
+    def discard(self):
+        for path in self.final_paths:
+            if os.path.exists(partial_path(path)):
+                os.remove(partial_path(path))
+
+def write_filtered_table(df: pd.DataFrame, output_path: str, geo_outputs: dict = None):
+    """
+    Writes a complete filtered table like write_filtered_rows, but through partial files
+    that are verified and renamed into place (see commit_table).
+    """
+    outputs = FilteredOutputs(output_path, geo_outputs)
+    try:
+        outputs.write(df, first_chunk=True)
+        outputs.commit()
+    except BaseException:
+        outputs.discard()
+        raise
+
+def read_filtered_chunks(csv_file, expression: FilterExpression, chunksize: int = DEFAULT_CHUNK_ROWS, csv_engine: str = "pandas"):
+    """
+    Parses a CSV piece by piece and yields the rows of each piece matching expression.
+    With the pyarrow engine each record batch is filtered before it is converted to pandas.
+
+    Yields:
+        tuple[list[str], int, pd.DataFrame, int]: (columns, rows parsed, matching rows, bytes held by the parsed piece).
+            A CSV without rows yields a single empty piece with its columns
+    """
+    if csv_engine == "pyarrow":
+        with closing(read_statcan_csv_arrow(csv_file, keep_columns=expression.columns, stream=True)) as reader:
+            batches = 0
+            for batch in reader:
+                filtered = batch.filter(pyarrow.array(expression.mask(batch))).to_pandas()
+                yield batch.schema.names, batch.num_rows, filtered, batch.nbytes
+                batches += 1
+            # A header-only CSV has no record batch, yield an empty piece so the header is still written
+            if not batches:
+                yield reader.schema.names, 0, reader.schema.empty_table().to_pandas(), 0
+        return
+
+    with read_statcan_csv(csv_file, keep_columns=expression.columns, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield list(chunk.columns), len(chunk), chunk[expression.mask(chunk)], int(chunk.memory_usage(deep=True).sum())
+
+def filter_csv_chunks(csv_file, output_path: str, filters: dict, chunksize: int = DEFAULT_CHUNK_ROWS, stop_event: Event = None,
+                      geo_outputs: dict = None, csv_engine: str = "pandas") -> dict:
+    """
+    Reads a CSV in chunks, applies filters to each chunk and appends the matching rows
+    to output_path. The full table is never built in memory, and each chunk only holds the
+    columns the wizard uses (see read_statcan_csv).
+    Rows are written to partial files which replace the output files only once complete and verified.
+    Can be safely stopped using stop_event, in which case the partial files are removed and the previous output kept.
+    File inputs stop at the parser's next read rather than at the end of the current chunk.
+
+    Parameters:
+        csv_file (str | file-like): CSV to read (Ex: an open file from a ZipFile)
+        output_path (str): Path the filtered rows are written to
+        filters (dict | FilterExpression): Dictionary of filters (Ex: {"GEO": ["Alberta"]}), see FilterExpression
+        chunksize (int): Number of rows parsed per chunk
+        stop_event (threading.Event, optional): Event to signal stopping
+        geo_outputs (dict, optional): {GEO value: output path} to write each geography to its own file
+            in the same pass. output_path is ignored when given
+        csv_engine (str): CSV parser, "pandas", "pyarrow" (multithreaded, record batches of ARROW_BLOCK_SIZE bytes
+            instead of chunksize rows) or "auto"
+
+    Returns:
+        dict: {
+            "stopped": bool,
+            "rows_read": int,
+            "rows_written": int,
+            "peak_memory": int,          # Largest chunk held in memory, in bytes
+            "missing_columns": list[str] # Filter columns not present in the CSV
+        }
+    """
+    stats = {"stopped": False, "rows_read": 0, "rows_written": 0, "peak_memory": 0, "missing_columns": []}
+    first_chunk = True
+    outputs = FilteredOutputs(output_path, geo_outputs)
+    expression = filters if isinstance(filters, FilterExpression) else FilterExpression(filters)
+    if stop_event and not isinstance(csv_file, str):
+        csv_file = CancellableReader(csv_file, stop_event)
+
+    # Each piece is filtered with a single mask so no intermediate copies are made
+    try:
+        with closing(read_filtered_chunks(csv_file, expression, chunksize, resolve_csv_engine(csv_engine))) as chunks:
+            for columns, rows_read, filtered, chunk_bytes in chunks:
+                if stop_event and stop_event.is_set():
+                    stats["stopped"] = True
+                    break
+
+                if first_chunk:
+                    stats["missing_columns"] = [key for key in sorted(expression.columns) if key not in columns]
+
+                # Header is written with the first chunk even if nothing matched
+                outputs.write(filtered, first_chunk)
+
+                stats["rows_read"] += rows_read
+                stats["rows_written"] += len(filtered)
+                stats["peak_memory"] = max(stats["peak_memory"], chunk_bytes)
+                first_chunk = False
+
+        if not stats["stopped"]:
+            outputs.commit()
+    except Exception:
+        outputs.discard()
+        # The parser may wrap DownloadCancelled in its own error type
+        if not (stop_event and stop_event.is_set()):
+            raise
+        stats["stopped"] = True
+
+    if stats["stopped"]:
+        outputs.discard()
+
+    return stats
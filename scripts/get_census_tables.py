@@ -2,6 +2,7 @@ import pandas as pd
 import requests
 from datetime import datetime
 from utils.get_data_path import get_data_path
+from utils.cube_catalog import CubeCatalog, DEFAULT_CATALOG_TTL
 
 # Returns a list of the past 3 census years based on the current date
 def get_last_available_census_years():
@@ -10,49 +11,73 @@ def get_last_available_census_years():
     latest_census_year = year - ((year - 1) % 5)
     return [latest_census_year - 5*i for i in range(3)]
 
-# Saves a list of the most current census data
-# Returns [filename, year] if census data is found, otherwise False
-def get_census_tables(status_label=None):
-    url = "https://www150.statcan.gc.ca/t1/wds/rest/getAllCubesListLite"
+# Census year named in a table title (Ex: "Farm type, Census of Agriculture, 2021" → 2021)
+CENSUS_YEAR_PATTERN = r"(?<!\d)((?:19|20)\d{2})(?!\d)"
 
+# Splits the cube list into the Agriculture Census tables of each year in a single pass over the titles
+# Returns {year: DataFrame} for the given years that have tables, in cube list order
+def classify_census_tables(df, years):
+    titles = df['cubeTitleEn'].fillna("").astype(str).str.lower()
+    census = df[titles.str.contains("agriculture", regex=False) & titles.str.contains("census", regex=False)]
+    if census.empty:
+        return {}
+
+    # One row per (table, year named in its title). A title naming two census years belongs to both
+    found = census['cubeTitleEn'].astype(str).str.extractall(CENSUS_YEAR_PATTERN)[0].astype(int)
+    found = found[found.isin(years)].droplevel("match")
+    pairs = found.reset_index().drop_duplicates()
+    pairs.columns = ["row", "year"]
+
+    return {int(year): census.loc[group["row"]] for year, group in pairs.groupby("year", sort=False)}
+
+# Saves the list of census tables of each of the last 3 census years that has any, in a single run
+# The cube list comes from the local CubeCatalog, refreshed from StatCan once it is older than max_age seconds
+# Returns [[filename, year], ...] most recent first (empty if no census data is found), or False on error
+def get_all_census_tables(status_label=None, max_age=DEFAULT_CATALOG_TTL, full_refresh=False):
     try:
-        response = requests.get(url, timeout=15)
+        table_list, source = CubeCatalog().get_cubes(max_age=max_age, full_refresh=full_refresh)
     except requests.exceptions.Timeout:
         if status_label:
             status_label.config(text="⚠️ Request to Statistics Canada timed out after 15s.")
         return False
+    except ValueError as e:
+        # Also catches invalid JSON, which requests raises as a RequestException too
+        if status_label:
+            status_label.config(text=f"⚠️ Failed to parse census data: {e}")
+        return False
     except requests.exceptions.RequestException as e:
         if status_label:
             status_label.config(text=f"⚠️ Failed to connect: {e}")
         return False
 
     try:
-        table_list = response.json()
         df = pd.DataFrame(table_list)
     except Exception as e:
         if status_label:
             status_label.config(text=f"⚠️ Failed to parse census data: {e}")
         return False
 
-    census_years_to_try = get_last_available_census_years()
-
-    # Keywords to filter for just the Agriculture Census tables
-    for year in census_years_to_try:
-        mask = (
-            df['cubeTitleEn'].str.contains("Agriculture", case=False, na=False) &
-            df['cubeTitleEn'].str.contains("Census", case=False, na=False) &
-            df['cubeTitleEn'].str.contains(str(year), case=False, na=False)
-        )
-        filtered = df[mask]
+    census_years = get_last_available_census_years()
+    tables_by_year = classify_census_tables(df, census_years) if not df.empty else {}
 
-        if not filtered.empty:
+    saved = []
+    for year in census_years:
+        if year in tables_by_year:
             filename = get_data_path(f"agriculture_census_tables_{year}.csv", f"data/{year}")
-            filtered.to_csv(filename, index=False)
-
-            if status_label:
-                status_label.config(text=f"✅ Found census tables for {year}")
-            return [filename, year]
+            tables_by_year[year].to_csv(filename, index=False)
+            saved.append([filename, year])
 
     if status_label:
-        status_label.config(text="⚠️ No census data found for last 3 census years.")
-    return False
\ No newline at end of file
+        if saved:
+            offline = " (offline, using the saved catalog)" if source == "offline" else ""
+            years = ", ".join(str(year) for _, year in saved)
+            status_label.config(text=f"✅ Found census tables for {years}{offline}")
+        else:
+            status_label.config(text="⚠️ No census data found for last 3 census years.")
+    return saved
+
+# Saves the list of census tables of every available census year (see get_all_census_tables)
+# Returns [filename, year] of the most recent one if census data is found, otherwise False
+def get_census_tables(status_label=None, max_age=DEFAULT_CATALOG_TTL, full_refresh=False):
+    saved = get_all_census_tables(status_label, max_age, full_refresh)
+    return saved[0] if saved else False
@@ -1,22 +1,232 @@
+import math
+import os
+import re
 import pandas as pd
+from collections import Counter
+from functools import lru_cache
 
-def get_product_id_by_keyword(file_path, keyword, col="cubeTitleEn"):
+# Catalog columns the wizard uses, the rest of the cube list is not loaded
+CATALOG_COLUMNS = ("productId", "cubeTitleEn", "releaseTime")
+
+# Words too common in titles to tell tables apart
+STOPWORDS = {"a", "and", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+# BM25 term frequency saturation and title length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A keyword word that is only part of a title word (Ex: "bee" in "honeybees") scores this fraction of a full match
+PARTIAL_WEIGHT = 0.5
+
+# Added to the score when the whole keyword appears in the title, and when the title starts with it
+PHRASE_BOOST = 2.0
+LEADING_BOOST = 1.0
+
+# Added when the title names the census year being downloaded
+YEAR_BOOST = 1.5
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens of a title or keyword (Ex: "Bees, Census" → ["bees", "census"])"""
+    return re.findall(r"\w+", str(text).lower())
+
+def stem(token: str) -> str:
+    """Light plural stripping (Ex: "inventories" → "inventory", "fruits" → "fruit")"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def search_terms(text: str) -> list:
+    """Stemmed tokens without stopwords, as used for ranking"""
+    return [stem(token) for token in tokenize(text) if token not in STOPWORDS]
+
+class CensusTableCatalog:
+    """
+    Census tables catalog (agriculture_census_tables_<year>.csv) loaded once, with an inverted index
+    from stemmed title terms to rows and their BM25 statistics, so search() ranks every candidate
+    of a keyword without scanning the other titles.
+
+    Each entry is { "productId": int, "cubeTitleEn": str, "releaseTime": str | None }, in catalog order.
+    """
+    def __init__(self, df: pd.DataFrame, col: str = "cubeTitleEn"):
+        self.col = col
+        self.entries = []
+        self._by_id = {}
+        self._term_counts = []
+        self._term_postings = {}
+
+        release_times = df["releaseTime"] if "releaseTime" in df.columns else [None] * len(df)
+        for position, (product_id, title, release_time) in enumerate(zip(df["productId"], df[col], release_times)):
+            entry = {
+                "productId": int(product_id),
+                col: "" if pd.isna(title) else str(title),
+                "releaseTime": None if pd.isna(release_time) else str(release_time),
+            }
+            self.entries.append(entry)
+            self._by_id.setdefault(entry["productId"], entry)
+
+            terms = Counter(search_terms(entry[col]))
+            self._term_counts.append(terms)
+            for term in terms:
+                self._term_postings.setdefault(term, []).append(position)
+
+        # BM25 statistics over the stemmed title terms
+        lengths = [sum(terms.values()) for terms in self._term_counts]
+        self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self._lengths = lengths
+        count = len(self.entries)
+        self._idf = {
+            term: math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, rows in self._term_postings.items()
+        }
+        self._partial_terms = {}
+
+    @classmethod
+    def from_csv(cls, file_path: str, col: str = "cubeTitleEn"):
+        columns = set(CATALOG_COLUMNS) | {col}
+        return cls(pd.read_csv(file_path, usecols=lambda c: c in columns), col)
+
+    def _term_score(self, term: str, row: int) -> float:
+        """BM25 weight of one title term in one row"""
+        frequency = self._term_counts[row][term]
+        norm = 1 - BM25_B + BM25_B * self._lengths[row] / self._average_length if self._average_length else 1
+        return self._idf[term] * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+
+    def _matching_terms(self, term: str) -> list:
+        """Title terms a keyword term matches: itself, or the title terms containing it (Ex: "bee" → "honeybee")"""
+        if term not in self._partial_terms:
+            self._partial_terms[term] = [other for other in self._term_postings if term in other and other != term]
+        return ([term] if term in self._term_postings else []) + self._partial_terms[term]
+
+    def search(self, keyword: str, year: int = None, limit: int = None) -> list:
+        """
+        Ranks the tables matching keyword, best first. Every keyword word (stopwords aside) must
+        match a title word, fully or partially; the score then rewards rare words, short titles,
+        the keyword appearing as a phrase or at the start of the title, and the census year.
+
+        Parameters:
+            keyword (str): Search keyword (Ex: "fruits")
+            year (int, optional): Census year being downloaded, titles naming it get YEAR_BOOST
+            limit (int, optional): Only return the best limit results
+
+        Returns:
+            list[dict]: Entries with "score" and "explain" added:
+                { **entry, "score": float, "explain": { "terms": {term: score}, "phrase": float, "leading": float, "year": float } }
+        """
+        terms = list(dict.fromkeys(search_terms(keyword)))
+        if not terms:
+            return []
+
+        # Step 1: Every term has to match somewhere in the title
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for title_term in self._matching_terms(term):
+                weight = 1.0 if title_term == term else PARTIAL_WEIGHT
+                for row in self._term_postings[title_term]:
+                    score = weight * self._term_score(title_term, row)
+                    term_scores[row] = max(term_scores.get(row, 0.0), score)
+            if scores is None:
+                scores = {row: {term: score} for row, score in term_scores.items()}
+            else:
+                scores = {row: {**found, term: term_scores[row]} for row, found in scores.items() if row in term_scores}
+
+        # Step 2: Phrase, leading and year boosts
+        needle = " ".join(tokenize(keyword))
+        results = []
+        for row, term_scores in scores.items():
+            entry = self.entries[row]
+            title = " ".join(tokenize(entry[self.col]))
+            explain = {
+                "terms": {term: round(score, 3) for term, score in term_scores.items()},
+                "phrase": PHRASE_BOOST if needle in title else 0.0,
+                "leading": LEADING_BOOST if title.startswith(needle) else 0.0,
+                "year": YEAR_BOOST if year and str(year) in tokenize(entry[self.col]) else 0.0,
+            }
+            score = sum(term_scores.values()) + explain["phrase"] + explain["leading"] + explain["year"]
+            results.append({**entry, "score": round(score, 3), "explain": explain, "_row": row})
+
+        # Ties keep catalog order
+        results.sort(key=lambda result: (-result["score"], result["_row"]))
+        for result in results:
+            del result["_row"]
+        return results[:limit] if limit else results
+
+    def explain(self, keyword: str, year: int = None, limit: int = 3) -> str:
+        """
+        Describes why search() picks a table for keyword, one line per candidate.
+
+        Example:
+            bees → 32100218 Bees, Census of Agriculture, 2021 (score 5.86: bee 1.36, phrase +2.0, leading +1.0, year +1.5)
+        """
+        results = self.search(keyword, year, limit)
+        if not results:
+            return f"{keyword} → no match"
+
+        lines = []
+        for rank, result in enumerate(results):
+            explain = result["explain"]
+            parts = [f"{term} {score}" for term, score in explain["terms"].items()]
+            parts += [f"{name} +{explain[name]}" for name in ("phrase", "leading", "year") if explain[name]]
+            prefix = f"{keyword} →" if rank == 0 else " " * len(keyword) + "  "
+            lines.append(f"{prefix} {result['productId']} {result[self.col]} (score {result['score']}: {', '.join(parts)})")
+        return "\n".join(lines)
+
+    def resolve(self, keywords, year: int = None) -> dict:
+        """
+        Resolves several keywords at once (Ex: the whole download plan).
+
+        Returns:
+            dict: { keyword: ranked search() results, best first, empty if none }
+        """
+        return {keyword: self.search(keyword, year) for keyword in keywords}
+
+    def get_product_id(self, keyword: str, year: int = None):
+        matches = self.search(keyword, year, limit=1)
+        return matches[0]["productId"] if matches else None
+
+    def get_release_time(self, product_id):
+        entry = self._by_id.get(int(product_id))
+        return entry["releaseTime"] if entry else None
+
+@lru_cache(maxsize=8)
+def _load_catalog(file_path: str, col: str, modified: float) -> CensusTableCatalog:
+    return CensusTableCatalog.from_csv(file_path, col)
+
+def load_catalog(file_path: str, col: str = "cubeTitleEn") -> CensusTableCatalog:
     """
-    Returns the productId (int) for the first row where the specified column 
-    contains the given keyword.
+    Returns the CensusTableCatalog of a census tables CSV. The catalog is parsed once
+    and kept in memory until the file changes.
+    """
+    return _load_catalog(os.path.abspath(file_path), col, os.path.getmtime(file_path))
+
+def get_product_id_by_keyword(file_path, keyword, col="cubeTitleEn", year=None):
+    """
+    Returns the productId (int) of the best ranked row for the given keyword
+    (see CensusTableCatalog.search).
 
     Args:
         file_path (str): Path to the CSV file.
         keyword (str): The search keyword.
         col (str): The column to search in (default = "cubeTitleEn").
+        year (int, optional): Census year, titles naming it rank higher.
 
     Returns:
         int or None: The productId if found, otherwise None.
     """
-    df = pd.read_csv(file_path)
-    
-    match = df[df[col].str.contains(keyword, case=False, na=False)]
+    return load_catalog(file_path, col).get_product_id(keyword, year)
+
+
+def get_release_time(file_path, product_id):
+    """
+    Returns the releaseTime (str) StatCan lists for a productId in the census tables CSV.
 
-    if not match.empty:
-        return int(match.iloc[0]["productId"])
-    return None
+    Args:
+        file_path (str): Path to the CSV file.
+        product_id (int): The StatCan productId.
+
+    Returns:
+        str or None: The release timestamp if found, otherwise None.
+    """
+    return load_catalog(file_path).get_release_time(product_id)
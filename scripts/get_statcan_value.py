@@ -1,12 +1,12 @@
 import os
-import re
-import pandas as pd
+from utils.dimension_index import load_dimension_index, normalize_name
 from utils.get_data_path import get_data_path
 from utils.to_native import to_native
+from utils.table_storage import load_table, is_table_file, READ_PREFERENCE
 
 def get_statcan_value(file_keyword, name_keywords, unit_of_measure, data_folder="data"):
     """
-    Search for the most recent StatsCan CSV file containing file_keyword,
+    Search for the most recent StatsCan table file (CSV, Feather, Parquet or pickle) containing file_keyword,
     filter by name_keywords + unit_of_measure, and return VALUE, STATUS, and folder year.
 
     Parameters:
@@ -32,19 +32,20 @@ def get_statcan_value(file_keyword, name_keywords, unit_of_measure, data_folder=
     # Find the most recent matching file
     for year in year_folders:
         year_path = get_data_path("", os.path.join(data_folder, year))
-        for fname in os.listdir(year_path):
-            if file_keyword.lower() in fname.lower() and fname.endswith(".csv"):
-                target_file = get_data_path(fname, os.path.join(data_folder, year))
-                year_used = year
-                break
-        if target_file:
+        matches = [f for f in os.listdir(year_path) if file_keyword.lower() in f.lower() and is_table_file(f)]
+        if matches:
+            # Keep the first match, but read its fastest available format
+            stem = os.path.splitext(matches[0])[0]
+            fname = next(stem + ext for ext in READ_PREFERENCE if stem + ext in matches)
+            target_file = get_data_path(fname, os.path.join(data_folder, year))
+            year_used = year
             break
 
     if not target_file:
         raise FileNotFoundError(f"No file with keyword '{file_keyword}' found in {data_folder}")
 
-    # Load the file
-    df = pd.read_csv(target_file)
+    # Load the file (format detected from the extension)
+    df = load_table(target_file)
 
     # Identify the "name" column (first non-standard one)
     standard_cols = {"REF_DATE", "GEO", "DGUID", "Unit of measure", "UOM", "VALUE", "STATUS"}
@@ -60,21 +61,32 @@ def get_statcan_value(file_keyword, name_keywords, unit_of_measure, data_folder=
     else:
         raise ValueError("No Unit of measure or UOM column found")
 
-    # --- Normalize for case + punctuation insensitive comparison ---
-    def normalize(text):
-        if pd.isna(text):
-            return ""
-        return re.sub(r"[^\w\s]", "", str(text)).lower().strip()
-
-    df["_normalized_name"] = df[name_col].map(normalize)
-    normalized_keywords = [normalize(kw) for kw in name_keywords]
-
-    # Only match rows where ALL keywords appear in the normalized name
-    def row_matches_keywords(name):
-        return all(kw in name for kw in normalized_keywords)
-
-    mask = df["_normalized_name"].apply(row_matches_keywords)
-
+    # Resolve the keywords to exact item names with the table's dimension index, so rows are matched
+    # by category instead of scanning every name. Tables without an index fall back to the scan
+    index = load_dimension_index(target_file)
+    members = index.find_members(name_col, name_keywords) if index else None
+
+    mask = None
+    if members is not None:
+        # Data CSV cells may carry the classification code (Ex: "Tame hay [1151111]")
+        names = set()
+        for member in members:
+            names.add(member["name"])
+            if member.get("code"):
+                names.add(f"{member['name']} [{member['code']}]")
+        mask = df[name_col].isin(names)
+
+    # The index may not describe this file's names exactly, scan them before giving up
+    if mask is None or not mask.any():
+        # --- Normalize for case + punctuation insensitive comparison ---
+        normalized_keywords = [normalize_name(kw) for kw in name_keywords]
+
+        # Only match rows where ALL keywords appear in the normalized name
+        def row_matches_keywords(name):
+            return all(kw in name for kw in normalized_keywords)
+
+        # astype(bool): the lean reader loads names as categoricals, which would keep the mask categorical too
+        mask = df[name_col].map(normalize_name).apply(row_matches_keywords).astype(bool)
 
     # Filter by UOM
     mask &= df[uom_col] == unit_of_measure
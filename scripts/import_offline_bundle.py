@@ -0,0 +1,117 @@
+import os
+import re
+import shutil
+import tempfile
+from scripts.extract_census_data import extract_census_data
+from utils.get_data_path import get_data_path
+
+# StatCan names table ZIPs after the product ID (Ex: 32100231-eng.zip)
+PRODUCT_ID_PATTERN = re.compile(r"^(\d{8})")
+
+# Catalog saved by get_census_tables (Ex: agriculture_census_tables_2021.csv)
+CATALOG_PATTERN = re.compile(r"^agriculture_census_tables_(\d{4})\.csv$")
+
+def find_bundle_zips(folder: str) -> dict:
+    """
+    Finds the StatCan table ZIPs anywhere under folder.
+
+    Returns:
+        dict: { product ID (int): path of the table ZIP }
+    """
+    zips = {}
+    for root, _, files in os.walk(folder):
+        for file in sorted(files):
+            match = PRODUCT_ID_PATTERN.match(file)
+            if match and file.lower().endswith(".zip"):
+                zips.setdefault(int(match.group(1)), os.path.join(root, file))
+    return zips
+
+def find_bundle_catalog(folder: str):
+    """
+    Finds the census tables catalog CSV anywhere under folder, preferring the most recent year.
+
+    Returns:
+        tuple[str, int] | None: (catalog path, census year), or None if there is no catalog
+    """
+    catalogs = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            match = CATALOG_PATTERN.match(file)
+            if match:
+                catalogs.append((int(match.group(1)), os.path.join(root, file)))
+
+    if not catalogs:
+        return None
+    year, path = max(catalogs)
+    return path, year
+
+def import_offline_bundle(bundle_path: str, catalog_csv: str = None, year: int = None, progressbar=None, status_label=None,
+                          stop_event=None, **kwargs):
+    """
+    Imports a year of census tables from previously downloaded StatCan table ZIPs (Ex: copied from a USB drive)
+    instead of the WDS API. The ZIPs are matched to the download plan by product ID and filtered in parallel,
+    exactly like extract_census_data.
+
+    Parameters:
+        bundle_path (str): Folder holding the table ZIPs, or an archive of them (.zip, .tar, .tar.gz, ...)
+        catalog_csv (str, optional): agriculture_census_tables_<year>.csv catalog. Found in the bundle when not given
+        year (int, optional): Census year of the bundle. Read from the catalog filename when not given
+        progressbar (ttk.Progressbar, optional): Updated as each table completes
+        status_label (ttk.Label, optional): Shows the status of each table
+        stop_event (threading.Event, optional): Event to signal stopping the import
+        **kwargs: Passed to extract_census_data (Ex: max_workers, geographies, storage_format)
+
+    Returns:
+        [filename, year] of the catalog used if the bundle was imported, otherwise False
+    """
+    def show(text):
+        if status_label:
+            status_label.config(text=text)
+
+    if not os.path.exists(bundle_path):
+        show(f"⚠️ Offline bundle not found: {bundle_path}")
+        return False
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        # Step 1: Unpack archives, folders are read in place
+        if os.path.isdir(bundle_path):
+            folder = bundle_path
+        else:
+            show("Unpacking offline bundle...")
+            try:
+                shutil.unpack_archive(bundle_path, temp_folder)
+            except (shutil.ReadError, ValueError) as e:
+                show(f"⚠️ Could not unpack offline bundle: {e}")
+                return False
+            folder = temp_folder
+
+        # Step 2: Find the table ZIPs and the catalog
+        bundle = find_bundle_zips(folder)
+        if not bundle:
+            show("⚠️ No StatCan table ZIPs found in the offline bundle.")
+            return False
+
+        if not catalog_csv:
+            found = find_bundle_catalog(folder)
+            if not found:
+                show("⚠️ No agriculture_census_tables_<year>.csv catalog found in the offline bundle.")
+                return False
+            catalog_csv, catalog_year = found
+            year = year or catalog_year
+        elif not year:
+            match = CATALOG_PATTERN.match(os.path.basename(catalog_csv))
+            if not match:
+                show("⚠️ Census year of the offline bundle is unknown.")
+                return False
+            year = int(match.group(1))
+
+        # Step 3: Keep a copy of the catalog where get_census_tables would have saved it
+        filename = get_data_path(f"agriculture_census_tables_{year}.csv", f"data/{year}")
+        if os.path.abspath(catalog_csv) != os.path.abspath(filename):
+            shutil.copyfile(catalog_csv, filename)
+
+        # Step 4: Filter every table of the plan from the bundle
+        show(f"Importing {len(bundle)} tables for {year} from the offline bundle...")
+        extract_census_data(filename, year, progressbar, status_label, stop_event, bundle=bundle, **kwargs)
+
+    return [filename, year]
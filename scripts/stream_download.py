@@ -0,0 +1,218 @@
+import io
+import json
+import os
+import re
+import requests
+from tempfile import SpooledTemporaryFile
+from threading import Event
+from urllib.parse import urlparse
+from utils.cancellation import abort_response, close_on_stop
+from utils.get_data_path import get_data_path
+from utils.http_session import statcan_get
+from utils.transfer_progress import TransferProgress
+
+# Downloads smaller than this stay in memory, larger ones roll over to a temp file on disk
+DEFAULT_SPOOL_MAX_SIZE = 32 * 1024 * 1024  # 32 MB
+
+# Size of each piece read from the HTTP response
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Interrupted resumable downloads are kept here until they complete
+PARTIAL_FOLDER = "data/partial"
+
+# Times a resumable download is picked up again after the connection drops
+MAX_RESUME_ATTEMPTS = 5
+
+def stream_download(url: str, timeout: int = 15, stop_event: Event = None,
+                    spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    progress: TransferProgress = None):
+    """
+    Streams a file into a spooled temporary file chunk by chunk so peak memory
+    stays bounded by spool_max_size instead of growing with the file size.
+    Can be safely stopped using stop_event: the socket is shut down and the temp file
+    removed within about CANCEL_POLL_INTERVAL, even while waiting on the network.
+
+    Parameters:
+        url (str): URL of the file to download
+        timeout (int): Timeout in seconds for HTTP requests
+        stop_event (threading.Event, optional): Event to signal stopping the download
+        spool_max_size (int): Bytes kept in memory before the file rolls over to disk
+        chunk_size (int): Bytes read from the response at a time
+        progress (TransferProgress, optional): Receives the bytes downloaded
+
+    Returns:
+        SpooledTemporaryFile | None: The downloaded file rewound to the start,
+        or None if the download was stopped. The caller is responsible for closing it.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails
+    """
+    spooled_file = SpooledTemporaryFile(max_size=spool_max_size, mode="w+b")
+
+    try:
+        with statcan_get(url, timeout=timeout, stream=True, stop_event=stop_event) as response, \
+                close_on_stop(stop_event, lambda: abort_response(response)):
+            response.raise_for_status()
+            if progress:
+                length = response.headers.get("Content-Length")
+                progress.start(int(length) if length and length.isdigit() else None)
+
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if stop_event and stop_event.is_set():
+                    spooled_file.close()
+                    return None
+                if chunk:
+                    spooled_file.write(chunk)
+                    if progress:
+                        progress.update(len(chunk))
+    except BaseException as e:
+        spooled_file.close()
+        # Aborting the socket on cancel surfaces as a connection error
+        if isinstance(e, Exception) and stop_event and stop_event.is_set():
+            return None
+        raise
+
+    spooled_file.seek(0)
+    return spooled_file
+
+
+class DownloadedFile(io.FileIO):
+    """Read only file of a finished resumable download. The file is deleted when closed."""
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        try:
+            os.remove(self.name)
+        except OSError:
+            pass
+
+def _discard_partial(part_path: str, meta_path: str):
+    for path in (part_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _load_partial_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return {}
+
+def _resume_once(url: str, part_path: str, meta_path: str, timeout: int, stop_event: Event, chunk_size: int,
+                 progress: TransferProgress = None) -> str:
+    """
+    Makes one attempt at finishing a resumable download.
+
+    Returns:
+        str: "complete", "stopped", "incomplete" (connection ended early) or "restart" (partial is no longer valid)
+    """
+    meta = _load_partial_meta(meta_path)
+    offset = os.path.getsize(part_path) if meta and os.path.exists(part_path) else 0
+
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        # If-Range makes the server send the whole file instead if it changed since the partial was saved
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    with statcan_get(url, timeout=timeout, stream=True, stop_event=stop_event, headers=headers) as response, \
+            close_on_stop(stop_event, lambda: abort_response(response)):
+        if response.status_code == 416:
+            _discard_partial(part_path, meta_path)
+            return "restart"
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            # Only append if the server continues exactly where the partial ends, for the same file
+            match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+            total = int(match.group(2)) if match and match.group(2) != "*" else None
+            if not match or int(match.group(1)) != offset or (meta.get("total") and total != meta["total"]):
+                _discard_partial(part_path, meta_path)
+                return "restart"
+            mode = "ab"
+        else:
+            # Full response: start over
+            offset = 0
+            length = response.headers.get("Content-Length")
+            total = int(length) if length and length.isdigit() else None
+            mode = "wb"
+
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag") or meta.get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or meta.get("last_modified"),
+            "total": total
+        }
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if progress:
+            progress.start(total, offset)
+
+        with open(part_path, mode) as out:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if stop_event and stop_event.is_set():
+                    return "stopped"
+                if chunk:
+                    out.write(chunk)
+                    if progress:
+                        progress.update(len(chunk))
+
+    size = os.path.getsize(part_path)
+    if total is None or size == total:
+        return "complete"
+    if size > total:
+        _discard_partial(part_path, meta_path)
+        return "restart"
+    return "incomplete"
+
+def resumable_download(url: str, timeout: int = 15, stop_event: Event = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       max_attempts: int = MAX_RESUME_ATTEMPTS, folder: str = PARTIAL_FOLDER, progress: TransferProgress = None):
+    """
+    Downloads a file to data/partial, resuming interrupted downloads with HTTP Range requests
+    instead of starting from byte zero. Partial files are checked against the advertised size
+    and ETag/Last-Modified, and survive timeouts, cancels and restarts of the program.
+
+    Parameters:
+        url (str): URL of the file to download
+        timeout (int): Timeout in seconds for HTTP requests
+        stop_event (threading.Event, optional): Event to signal stopping the download. The partial file is kept
+        chunk_size (int): Bytes read from the response at a time
+        max_attempts (int): Attempts made before giving up on a dropping connection
+        folder (str): Folder the partial downloads are kept in
+        progress (TransferProgress, optional): Receives the bytes downloaded, counting the resumed part
+
+    Returns:
+        DownloadedFile | None: The finished file opened for reading (deleted once closed),
+        or None if the download was stopped. The caller is responsible for closing it.
+
+    Raises:
+        requests.exceptions.RequestException: If the download could not be completed
+    """
+    name = os.path.basename(urlparse(url).path) or "download"
+    part_path = get_data_path(f"{name}.part", folder)
+    meta_path = f"{part_path}.json"
+
+    for attempt in range(max_attempts):
+        try:
+            status = _resume_once(url, part_path, meta_path, timeout, stop_event, chunk_size, progress)
+        except Exception as e:
+            # Aborting the socket on cancel surfaces as a connection error. The partial file is kept to resume later
+            if stop_event and stop_event.is_set():
+                return None
+
+            # Whatever arrived is kept on disk and the next attempt continues from there
+            retryable = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)
+            if not isinstance(e, retryable) or attempt == max_attempts - 1:
+                raise
+            continue
+
+        if status == "stopped":
+            return None
+        if status == "complete":
+            os.remove(meta_path)
+            return DownloadedFile(part_path, "r")
+
+    raise requests.exceptions.RequestException(f"Download of {name} did not complete after {max_attempts} attempts.")
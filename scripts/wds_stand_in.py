@@ -0,0 +1,343 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from utils.get_data_path import get_data_path
+from utils.http_session import WDS_URL, set_request_hook, set_wds_url, get_request_stats, reset_request_stats
+
+# Recorded WDS responses and table ZIPs are kept here
+FIXTURE_FOLDER = "fixtures/wds"
+
+# Bytes written to the socket at a time when replaying (the bandwidth limit is applied per piece)
+REPLAY_CHUNK_SIZE = 64 * 1024
+
+# Response headers worth replaying. Everything else is regenerated by the stand-in
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+def request_key(method: str, url: str, body: bytes = None) -> str:
+    """
+    Identifies a request independently of the host it was sent to.
+    POST bodies are part of the key so each getCubeMetadata/coordinate request replays its own response.
+    """
+    parsed = urlparse(url)
+    key = f"{method.upper()} {parsed.path}"
+    if parsed.query:
+        key += f"?{parsed.query}"
+    if body:
+        # JSON bodies are normalized so key order does not matter
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode("utf-8")
+        except ValueError:
+            pass
+        key += f" {hashlib.sha256(body).hexdigest()[:16]}"
+    return key
+
+class WdsRecorder:
+    """
+    Records every StatCan response (WDS JSON and table ZIPs) made through utils.http_session into a fixture folder
+    while it is active, so WdsStandIn can replay them.
+
+    Example:
+        with WdsRecorder():
+            census_tables, year = get_census_tables(full_refresh=True)
+            extract_census_data(census_tables, year, force=True, cache_max_bytes=0)
+
+    Streamed downloads are read fully into memory to be saved, so record on a machine with room for the largest ZIP.
+    """
+    def __init__(self, folder: str = FIXTURE_FOLDER):
+        self.folder = get_data_path("", folder)
+        self.index_path = os.path.join(self.folder, "index.json")
+        self.index = {"origins": [], "responses": {}}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def record(self, method: str, url: str, kwargs: dict, response):
+        body = None
+        if kwargs.get("json") is not None:
+            body = json.dumps(kwargs["json"]).encode("utf-8")
+        elif isinstance(kwargs.get("data"), (bytes, str)):
+            body = kwargs["data"].encode("utf-8") if isinstance(kwargs["data"], str) else kwargs["data"]
+
+        # Bodies are content addressed, so identical ZIPs are only stored once
+        body_file = None
+        if method.upper() != "HEAD":
+            content = response.content
+            body_file = f"{hashlib.sha256(content).hexdigest()}.bin"
+            body_path = get_data_path(body_file, os.path.join(self.folder, "bodies"))
+            if not os.path.exists(body_path):
+                with open(body_path, "wb") as f:
+                    f.write(content)
+
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with self._lock:
+            if origin not in self.index["origins"]:
+                self.index["origins"].append(origin)
+            self.index["responses"][request_key(method, url, body)] = {
+                "status": response.status_code,
+                "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+                "body": body_file
+            }
+
+    def save(self):
+        with self._lock:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, indent=2)
+
+    def __enter__(self):
+        set_request_hook(self.record)
+        return self
+
+    def __exit__(self, *exc):
+        set_request_hook(None)
+        self.save()
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.stand_in.respond(self, "GET")
+
+    def do_POST(self):
+        self.server.stand_in.respond(self, "POST")
+
+    def do_HEAD(self):
+        self.server.stand_in.respond(self, "HEAD")
+
+    def log_message(self, format, *args):
+        pass
+
+class WdsStandIn:
+    """
+    Local HTTP server replaying fixtures recorded by WdsRecorder, with optional latency and bandwidth limits.
+    Links to table ZIPs in WDS responses are rewritten to point back at the stand-in.
+
+    Example:
+        with WdsStandIn(latency=0.2, bandwidth=2_000_000) as stand_in:
+            set_wds_url(stand_in.wds_url)
+            get_census_tables(full_refresh=True)
+
+    Parameters:
+        folder (str): Fixture folder written by WdsRecorder
+        latency (float): Seconds added before each response
+        bandwidth (int, optional): Bytes per second each response body is limited to. None is unlimited
+        port (int): Port to listen on. 0 picks a free one
+    """
+    def __init__(self, folder: str = FIXTURE_FOLDER, latency: float = 0.0, bandwidth: int = None, port: int = 0):
+        self.folder = get_data_path("", folder)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.port = port
+        self.requests_served = 0
+        self.misses = []
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+        index_path = os.path.join(self.folder, "index.json")
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No recorded WDS fixtures in {self.folder}. Record some with WdsRecorder first")
+        with open(index_path, "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def wds_url(self) -> str:
+        """WDS base URL to pass to set_wds_url (or STATCAN_WDS_URL)"""
+        return self.base_url + urlparse(WDS_URL).path
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _StandInHandler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _lookup(self, method: str, path: str, body: bytes):
+        responses = self.index["responses"]
+        entry = responses.get(request_key(method, path, body))
+        # HEAD requests that were never recorded are answered from the matching GET
+        if entry is None and method == "HEAD":
+            entry = responses.get(request_key("GET", path))
+        return entry
+
+    def respond(self, handler: BaseHTTPRequestHandler, method: str):
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else None
+        entry = self._lookup(method, handler.path, body)
+
+        with self._lock:
+            self.requests_served += 1
+            if entry is None:
+                self.misses.append(request_key(method, handler.path, body))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if entry is None:
+            content = json.dumps({"status": "FAILED", "object": "No recorded response for this request"}).encode("utf-8")
+            handler.send_response(404)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(content)))
+            handler.end_headers()
+            if method != "HEAD":
+                handler.wfile.write(content)
+            return
+
+        headers = entry["headers"]
+        if headers.get("ETag") and handler.headers.get("If-None-Match") == headers["ETag"]:
+            handler.send_response(304)
+            handler.send_header("ETag", headers["ETag"])
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        content = b""
+        if entry["body"]:
+            with open(os.path.join(self.folder, "bodies", entry["body"]), "rb") as f:
+                content = f.read()
+            # Send ZIP links back to the stand-in instead of StatCan
+            if "json" in headers.get("Content-Type", ""):
+                for origin in self.index["origins"]:
+                    # JSON may escape the slashes of URLs
+                    for written in (origin, origin.replace("/", "\\/")):
+                        content = content.replace(written.encode("utf-8"), self.base_url.encode("utf-8"))
+
+        handler.send_response(entry["status"])
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        if method == "HEAD":
+            return
+
+        for start in range(0, len(content), REPLAY_CHUNK_SIZE):
+            piece = content[start:start + REPLAY_CHUNK_SIZE]
+            handler.wfile.write(piece)
+            if self.bandwidth:
+                time.sleep(len(piece) / self.bandwidth)
+
+def record_pipeline(folder: str = FIXTURE_FOLDER) -> dict:
+    """
+    Runs get_census_tables and extract_census_data against the real StatCan servers and records every response.
+
+    Returns:
+        dict: {"recorded": int, "folder": str}, or {"recorded": 0, ...} if no census tables were found
+    """
+    from scripts.get_census_tables import get_census_tables
+    from scripts.extract_census_data import extract_census_data
+
+    with WdsRecorder(folder) as recorder:
+        result = get_census_tables(full_refresh=True)
+        if result:
+            census_tables, year = result
+            extract_census_data(census_tables, year, force=True, cache_max_bytes=0)
+    return {"recorded": len(recorder.index["responses"]) if result else 0, "folder": recorder.folder}
+
+def benchmark_pipeline(folder: str = FIXTURE_FOLDER, latency: float = 0.0, bandwidth: int = None, **kwargs) -> dict:
+    """
+    Times get_census_tables → extract_census_data → import_recent_census_data end to end against a stand-in
+    replaying the recorded fixtures. Nothing is sent to StatCan.
+    The imported tables are written to data/<year>/ like a normal run. The wizard state used is a throwaway copy.
+
+    Parameters:
+        folder (str): Fixture folder written by WdsRecorder
+        latency (float): Seconds added before each response
+        bandwidth (int, optional): Bytes per second each response body is limited to
+        **kwargs: Passed to extract_census_data (Ex: max_workers, engine)
+
+    Returns:
+        dict: {
+            "get_census_tables": float, "extract_census_data": float,
+            "import_recent_census_data": float, "total": float,   # seconds
+            "requests": int,                                     # Requests the stand-in served
+            "misses": list[str],                                 # Requests with no recorded response
+            "error": str | None,                                 # Why import_recent_census_data stopped early
+            "request_stats": dict                                # get_request_stats() of the run
+        }
+    """
+    from scripts.get_census_tables import get_census_tables
+    from scripts.extract_census_data import extract_census_data
+    from scripts.import_recent_census_data import import_recent_census_data
+    from utils.wizard_data import WizardData
+
+    timings = {}
+    error = None
+    kwargs = {"force": True, "cache_max_bytes": 0, **kwargs}
+    reset_request_stats()
+
+    with WdsStandIn(folder, latency=latency, bandwidth=bandwidth) as stand_in:
+        set_wds_url(stand_in.wds_url)
+        wizard = WizardData("wds_benchmark_state.json")
+        try:
+            start = time.perf_counter()
+            # The full cube list is what was recorded, the saved catalog is not used
+            result = get_census_tables(full_refresh=True)
+            timings["get_census_tables"] = time.perf_counter() - start
+            if not result:
+                raise RuntimeError("The recorded fixtures have no census tables")
+
+            census_tables, year = result
+            start = time.perf_counter()
+            extract_census_data(census_tables, year, **kwargs)
+            timings["extract_census_data"] = time.perf_counter() - start
+
+            # Fixtures recorded with fewer tables than the wizard reads stop the import early
+            start = time.perf_counter()
+            try:
+                import_recent_census_data(wizard=wizard)
+            except FileNotFoundError as e:
+                error = str(e)
+            timings["import_recent_census_data"] = time.perf_counter() - start
+        finally:
+            set_wds_url(None)
+            if os.path.exists(wizard.filename):
+                os.remove(wizard.filename)
+
+    timings["total"] = sum(timings.values())
+    return {**timings, "requests": stand_in.requests_served, "misses": stand_in.misses, "error": error,
+            "request_stats": get_request_stats()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record StatCan WDS responses or replay them from a local stand-in server")
+    parser.add_argument("command", choices=["record", "serve", "benchmark"])
+    parser.add_argument("--folder", default=FIXTURE_FOLDER, help="Fixture folder")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before each response")
+    parser.add_argument("--bandwidth", type=int, default=None, help="Bytes per second per response")
+    parser.add_argument("--port", type=int, default=8750, help="Port of the stand-in (serve only)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        print(record_pipeline(args.folder))
+    elif args.command == "benchmark":
+        print(json.dumps(benchmark_pipeline(args.folder, args.latency, args.bandwidth), indent=2))
+    else:
+        with WdsStandIn(args.folder, args.latency, args.bandwidth, args.port) as stand_in:
+            print(f"Replaying {len(stand_in.index['responses'])} responses. Run the wizard with STATCAN_WDS_URL={stand_in.wds_url}")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
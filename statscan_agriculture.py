@@ -4,8 +4,8 @@ from gui.extract_data_page import create_extract_frame
 from gui.extrapolate_data_page import create_import_frame
 from gui.export_data_page import create_export_frame
 from utils.wizard_data import WizardData
+from utils.cancellation import StopEvent
 import ttkbootstrap as ttk
-import threading
 
 def main():
     wizard = WizardData("wizard_state.json")
@@ -15,7 +15,7 @@ def main():
     root.geometry("1000x600")
     
     # Create stop event for threads
-    stop_event = threading.Event()
+    stop_event = StopEvent()
     
     # Bind close button to safely stop threads
     def on_close():
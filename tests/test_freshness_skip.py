@@ -0,0 +1,138 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import zipfile
+import pandas as pd
+import pytest
+from scripts.extract_census_data import DOWNLOAD_PLAN, extract_census_data
+from scripts.wds_stand_in import WdsStandIn, request_key
+from utils.http_session import set_wds_url
+
+# Recorded links point at StatCan, the stand-in rewrites them to itself
+STATCAN_ORIGIN = "https://www150.statcan.gc.ca"
+WDS_PATH = "/t1/wds/rest"
+
+YEAR = 2021
+FIRST_PRODUCT_ID = 32100001
+
+DATA_CSV = (
+    "REF_DATE,GEO,DGUID,Item,UOM,UOM_ID,SCALAR_FACTOR,SCALAR_ID,VECTOR,COORDINATE,VALUE,STATUS,SYMBOL,TERMINATED,DECIMALS\n"
+    "2021,Alberta [PR480000000],2021A000248,Farms,Number,223,units,0,v1,1.1,100,,,,0\n"
+    "2021,Ontario [PR350000000],2021A000235,Farms,Number,223,units,0,v2,2.1,200,,,,0\n"
+)
+
+class StatusLabel:
+    """Stands in for the ttk label extract_census_data reports each table to"""
+    def __init__(self):
+        self.texts = []
+
+    def config(self, text=None):
+        self.texts.append(text)
+
+    def update_idletasks(self):
+        pass
+
+def make_table_zip() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("table.csv", DATA_CSV)
+        z.writestr("table_MetaData.csv", "Cube Title,Product Id\nTest table,32100001\n")
+    return buffer.getvalue()
+
+def write_fixture(folder: str, product_ids: list, head_status: int = None):
+    """
+    Writes a WdsRecorder style fixture for the given tables: their download link, their ZIP (with an ETag)
+    and a getCubeMetadata answer StatCan gives for cubes it cannot describe, so the default engine falls back
+    to the full table. head_status makes HEAD requests for the ZIPs fail with that status (Ex: 405).
+    """
+    os.makedirs(os.path.join(folder, "bodies"), exist_ok=True)
+    responses = {}
+
+    def add(method, path, content, headers, body=None, status=200):
+        body_file = None
+        if content is not None:
+            body_file = f"{hashlib.sha256(content).hexdigest()}.bin"
+            with open(os.path.join(folder, "bodies", body_file), "wb") as f:
+                f.write(content)
+        responses[request_key(method, STATCAN_ORIGIN + path, body)] = {"status": status, "headers": headers, "body": body_file}
+
+    table_zip = make_table_zip()
+    json_headers = {"Content-Type": "application/json"}
+    for product_id in product_ids:
+        zip_path = f"/t1/tbl1/en/dtbl/{product_id}-eng.zip"
+        link = {"status": "SUCCESS", "object": STATCAN_ORIGIN + zip_path}
+        add("GET", f"{WDS_PATH}/getFullTableDownloadCSV/{product_id}/en", json.dumps(link).encode("utf-8"), json_headers)
+        add("GET", zip_path, table_zip, {"Content-Type": "application/zip", "ETag": f'"{product_id}-v1"'})
+        if head_status:
+            add("HEAD", zip_path, None, {}, status=head_status)
+
+        metadata = [{"status": "FAILED", "object": f"Product {product_id} not found"}]
+        add("POST", f"{WDS_PATH}/getCubeMetadata", json.dumps(metadata).encode("utf-8"), json_headers,
+            body=json.dumps([{"productId": product_id}]).encode("utf-8"))
+
+    with open(os.path.join(folder, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"origins": [STATCAN_ORIGIN], "responses": responses}, f, indent=2)
+
+def write_catalog(path: str, with_release_time: bool):
+    """agriculture_census_tables_<year>.csv with one table per keyword of the download plan"""
+    pd.DataFrame({
+        "productId": [FIRST_PRODUCT_ID + i for i in range(len(DOWNLOAD_PLAN))],
+        "cubeTitleEn": [f"{keyword.capitalize()}, Census of Agriculture, {YEAR}" for keyword in DOWNLOAD_PLAN.values()],
+        "releaseTime": ["2022-05-11T08:30" if with_release_time else None] * len(DOWNLOAD_PLAN),
+    }).to_csv(path, index=False)
+
+@pytest.fixture
+def project_root(tmp_path, monkeypatch):
+    """Sends everything get_data_path writes (data/, fixtures/) to a temporary project root"""
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    monkeypatch.setattr(sys, "executable", str(tmp_path / "wizard"))
+    yield tmp_path
+    set_wds_url(None)
+
+@pytest.mark.parametrize("with_release_time", [True, False], ids=["release_time", "validators"])
+def test_second_run_skips_every_table(project_root, with_release_time):
+    fixture_folder = project_root / "fixtures" / "wds"
+    write_fixture(str(fixture_folder), [FIRST_PRODUCT_ID + i for i in range(len(DOWNLOAD_PLAN))])
+    catalog_path = str(project_root / f"agriculture_census_tables_{YEAR}.csv")
+    write_catalog(catalog_path, with_release_time)
+
+    with WdsStandIn(str(fixture_folder)) as stand_in:
+        set_wds_url(stand_in.wds_url)
+
+        first = StatusLabel()
+        extract_census_data(catalog_path, YEAR, status_label=first, storage_format="csv", cache_max_bytes=0)
+        assert all(text.startswith("✅") for text in first.texts), first.texts
+        assert len(first.texts) == len(DOWNLOAD_PLAN)
+
+        served = stand_in.requests_served
+        second = StatusLabel()
+        extract_census_data(catalog_path, YEAR, status_label=second, storage_format="csv", cache_max_bytes=0)
+        assert all(text.startswith("⏭️") for text in second.texts), second.texts
+        assert len(second.texts) == len(DOWNLOAD_PLAN)
+        assert not stand_in.misses
+
+        # Tables with a release time are skipped without asking StatCan, the others only send a link request and a HEAD
+        expected = 0 if with_release_time else 2 * len(DOWNLOAD_PLAN)
+        assert stand_in.requests_served - served == expected
+
+    # Every table was filtered to the default geography
+    table = pd.read_csv(project_root / "data" / str(YEAR) / f"bees_{YEAR}.csv")
+    assert list(table["GEO"]) == ["Alberta [PR480000000]"]
+
+def test_rejected_head_still_downloads(project_root):
+    """A server refusing the conditional HEAD (405) costs the skip, never the table"""
+    fixture_folder = project_root / "fixtures" / "wds"
+    write_fixture(str(fixture_folder), [FIRST_PRODUCT_ID + i for i in range(len(DOWNLOAD_PLAN))], head_status=405)
+    catalog_path = str(project_root / f"agriculture_census_tables_{YEAR}.csv")
+    write_catalog(catalog_path, with_release_time=False)
+
+    with WdsStandIn(str(fixture_folder)) as stand_in:
+        set_wds_url(stand_in.wds_url)
+        for _ in range(2):
+            status = StatusLabel()
+            extract_census_data(catalog_path, YEAR, status_label=status, storage_format="csv", cache_max_bytes=0)
+            assert all(text.startswith("✅") for text in status.texts), status.texts
+            assert len(status.texts) == len(DOWNLOAD_PLAN)
+        assert not stand_in.misses
@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# How often in-flight transfers check whether they were cancelled
+CANCEL_POLL_INTERVAL = 0.05
+
+class DownloadCancelled(Exception):
+    """Raised inside a transfer or parse when its stop_event is set"""
+
+class StopEvent(threading.Event):
+    """
+    threading.Event that remembers when it was set, so the time taken to actually stop can be measured.
+    Works anywhere a stop_event is accepted.
+    """
+    def __init__(self):
+        super().__init__()
+        self.set_at = None
+
+    def set(self):
+        if not self.is_set():
+            self.set_at = time.monotonic()
+        super().set()
+
+    def clear(self):
+        self.set_at = None
+        super().clear()
+
+def get_cancel_latency(stop_event) -> float:
+    """Seconds since stop_event was set, or None if it is not a StopEvent or was not set"""
+    set_at = getattr(stop_event, "set_at", None)
+    return time.monotonic() - set_at if set_at is not None else None
+
+class CancellableReader:
+    """
+    Wraps a file so every read raises DownloadCancelled once stop_event is set.
+    Parsers read their input a block at a time, so a long read_csv stops at the next block instead of at the end.
+    """
+    def __init__(self, file, stop_event: threading.Event = None):
+        self._file = file
+        self._stop_event = stop_event
+
+    def _check(self):
+        if self._stop_event is not None and self._stop_event.is_set():
+            raise DownloadCancelled("Stopped by user.")
+
+    def read(self, *args):
+        self._check()
+        return self._file.read(*args)
+
+    def read1(self, *args):
+        self._check()
+        return self._file.read1(*args)
+
+    def readinto(self, buffer):
+        self._check()
+        return self._file.readinto(buffer)
+
+    def readline(self, *args):
+        self._check()
+        return self._file.readline(*args)
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+def abort_response(response):
+    """
+    Shuts down the socket of a streamed requests response so a read blocked in another thread
+    fails straight away instead of waiting for the timeout, then closes the response.
+    """
+    raw = getattr(response, "raw", None)
+    # http.client response → socket file → socket
+    fp = getattr(getattr(raw, "_fp", None), "fp", None)
+    sock = getattr(getattr(fp, "raw", None), "_sock", None) or getattr(getattr(raw, "connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
+
+@contextmanager
+def close_on_stop(stop_event: threading.Event, *callbacks):
+    """
+    Runs callbacks (Ex: aborting a response) from a watcher thread as soon as stop_event is set
+    while the block is running. Does nothing without a stop_event.
+    """
+    if stop_event is None:
+        yield
+        return
+
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(CANCEL_POLL_INTERVAL):
+            if stop_event.is_set():
+                for callback in callbacks:
+                    callback()
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        done.set()
@@ -0,0 +1,181 @@
+import gzip
+import json
+import os
+import requests
+from datetime import date, datetime, timedelta
+from utils.get_data_path import get_data_path
+from utils.http_session import statcan_get, statcan_post, get_wds_url
+from utils.json_stream import iter_json_array
+
+# The saved cube list is used as is for this long before StatCan is asked for changes
+DEFAULT_CATALOG_TTL = 24 * 60 * 60  # 1 day
+
+# Catching up costs one getChangedCubeList request per day, past this many days the full list is downloaded instead
+MAX_DELTA_DAYS = 30
+
+# New cubes found by getChangedCubeList are looked up with getCubeMetadata this many at a time
+METADATA_BATCH_SIZE = 100
+
+# Fields of each cube the wizard uses, the rest of getAllCubesListLite is dropped while parsing
+CATALOG_FIELDS = ("productId", "cubeTitleEn", "releaseTime", "cubeStartDate", "cubeEndDate")
+
+# Only cubes with all of these words in their title are kept (the Census of Agriculture tables of every year)
+CATALOG_TITLE_KEYWORDS = ("agriculture", "census")
+
+# Bytes of the cube list read from the network at a time
+JSON_CHUNK_SIZE = 64 * 1024
+
+class CubeCatalog:
+    """
+    Local copy of StatCan's cube list (getAllCubesListLite), kept gzipped in data/cache so finding the
+    census tables does not download thousands of cubes every run, and still works offline.
+    Once older than the TTL it is brought up to date with getChangedCubeList instead of downloaded again.
+
+    Only the cubes whose title has all of title_keywords are kept, with CATALOG_FIELDS. The cube list is
+    parsed as it streams in (see iter_json_array), so the full payload is never held in memory.
+
+    Saved as:
+        {
+            "fetched_at": "2026-10-18T09:00:00",    # Last full download of the cube list
+            "refreshed_at": "2026-10-18T09:00:00",  # Last time StatCan was checked for changes
+            "title_keywords": ["agriculture", "census"],
+            "cubes": { productId (str): {field: value for field in CATALOG_FIELDS} },
+            "skipped": [productId, ...]             # Other cubes, so their changes are not looked up
+        }
+    """
+    def __init__(self, filename="cube_catalog.json.gz", folder="data/cache", title_keywords: tuple = CATALOG_TITLE_KEYWORDS):
+        self.filename = get_data_path(filename, folder)
+        self.title_keywords = [keyword.lower() for keyword in title_keywords]
+        self.data = self._empty()
+        self.load()
+
+    def _empty(self) -> dict:
+        return {"fetched_at": None, "refreshed_at": None, "title_keywords": self.title_keywords, "cubes": {}, "skipped": []}
+
+    def load(self):
+        """Load the catalog from file, starting empty if missing/corrupted or saved for other title keywords"""
+        try:
+            with gzip.open(self.filename, "rt", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, EOFError, json.JSONDecodeError):
+            self.data = self._empty()
+        if self.data.get("title_keywords") != self.title_keywords:
+            self.data = self._empty()
+
+    def keeps(self, cube: dict) -> bool:
+        """True if the cube belongs in the catalog"""
+        title = str(cube.get("cubeTitleEn") or "").lower()
+        return all(keyword in title for keyword in self.title_keywords)
+
+    def save(self):
+        # Written next to the catalog and renamed, so a crash never leaves half a catalog
+        temp_path = self.filename + ".partial"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(temp_path, self.filename)
+
+    @property
+    def cubes(self) -> list:
+        return list(self.data["cubes"].values())
+
+    def age(self):
+        """Seconds since the catalog was last brought up to date, or None if it never was"""
+        if not self.data.get("refreshed_at"):
+            return None
+        return (datetime.now() - datetime.fromisoformat(self.data["refreshed_at"])).total_seconds()
+
+    def get_cubes(self, max_age: float = DEFAULT_CATALOG_TTL, full_refresh: bool = False, timeout: int = 15):
+        """
+        Returns StatCan's cube list, from the saved catalog when it is recent enough.
+
+        Parameters:
+            max_age (float): Seconds the saved catalog is used without checking StatCan. 0 always checks
+            full_refresh (bool): Download the full cube list even if the saved catalog could be updated
+            timeout (int): Timeout of each request in seconds
+
+        Returns:
+            tuple[list[dict], str]: (cube entries, source) where source is "cache", "delta" (updated with
+                getChangedCubeList), "full" (downloaded again) or "offline" (StatCan unreachable, saved catalog used)
+
+        Raises:
+            requests.exceptions.RequestException, ValueError: StatCan is unreachable/answered badly and nothing is saved
+        """
+        age = self.age()
+        if not full_refresh and self.data["cubes"] and age is not None and age < max_age:
+            return self.cubes, "cache"
+
+        try:
+            if full_refresh or not self.data["cubes"] or age is None or age > MAX_DELTA_DAYS * 24 * 60 * 60:
+                self.refresh_full(timeout)
+                source = "full"
+            else:
+                self.refresh_changes(timeout)
+                source = "delta"
+        except (requests.exceptions.RequestException, ValueError):
+            if not self.data["cubes"]:
+                raise
+            return self.cubes, "offline"
+
+        self.save()
+        return self.cubes, source
+
+    def refresh_full(self, timeout: int = 15):
+        """Replaces the catalog with a fresh getAllCubesListLite, filtered while it downloads"""
+        data = self._empty()
+        with statcan_get(f"{get_wds_url()}/getAllCubesListLite", timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            for cube in iter_json_array(response.iter_content(JSON_CHUNK_SIZE), CATALOG_FIELDS):
+                if self.keeps(cube):
+                    data["cubes"][str(cube["productId"])] = cube
+                else:
+                    data["skipped"].append(cube["productId"])
+
+        data["fetched_at"] = data["refreshed_at"] = datetime.now().isoformat(timespec="seconds")
+        self.data = data
+
+    def refresh_changes(self, timeout: int = 15):
+        """
+        Applies getChangedCubeList for every day since the last refresh (that day included, it may have
+        had more releases after the check). Known cubes get their new releaseTime, new cubes are
+        looked up with getCubeMetadata.
+        """
+        # Step 1: Collect the latest release of every cube changed since the last refresh
+        changed = {}
+        day = datetime.fromisoformat(self.data["refreshed_at"]).date()
+        checked_at = datetime.now().isoformat(timespec="seconds")
+        while day <= date.today():
+            response = statcan_get(f"{get_wds_url()}/getChangedCubeList/{day.isoformat()}", timeout=timeout)
+            response.raise_for_status()
+            payload = response.json()
+            if payload.get("status") != "SUCCESS":
+                raise ValueError(f"getChangedCubeList failed for {day}: {payload.get('object')}")
+            for cube in payload.get("object") or []:
+                key = str(cube["productId"])
+                changed[key] = max(changed.get(key, ""), cube.get("releaseTime") or "")
+            day += timedelta(days=1)
+
+        # Step 2: Update the known cubes
+        skipped = set(self.data["skipped"])
+        new_ids = []
+        for key, release_time in changed.items():
+            if key in self.data["cubes"]:
+                self.data["cubes"][key]["releaseTime"] = release_time or self.data["cubes"][key].get("releaseTime")
+            elif int(key) not in skipped:
+                new_ids.append(int(key))
+
+        # Step 3: Fill in the titles and dates of new cubes
+        for start in range(0, len(new_ids), METADATA_BATCH_SIZE):
+            batch = new_ids[start:start + METADATA_BATCH_SIZE]
+            response = statcan_post(f"{get_wds_url()}/getCubeMetadata", json=[{"productId": pid} for pid in batch], timeout=timeout)
+            response.raise_for_status()
+            for entry in response.json():
+                if entry.get("status") != "SUCCESS":
+                    continue
+                cube = {field: entry["object"].get(field) for field in CATALOG_FIELDS}
+                cube["productId"] = int(cube["productId"])
+                if self.keeps(cube):
+                    self.data["cubes"][str(cube["productId"])] = cube
+                else:
+                    self.data["skipped"].append(cube["productId"])
+
+        self.data["refreshed_at"] = checked_at
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+import re
+from functools import lru_cache
+from utils.table_storage import partial_path
+
+# Saved next to each filtered table (Ex: farm_type_2021.dimensions.json)
+INDEX_SUFFIX = ".dimensions.json"
+
+def normalize_name(text) -> str:
+    """Lowercase and strip punctuation, so names compare case + punctuation insensitive"""
+    if text is None or text != text:  # None or NaN
+        return ""
+    return re.sub(r"[^\w\s]", "", str(text)).lower().strip()
+
+def _section_of(header: list) -> str:
+    """Names a section of the MetaData CSV from its header row"""
+    cells = [cell.strip().lower() for cell in header]
+    if cells[:2] == ["cube title", "product id"]:
+        return "cube"
+    if cells[:2] == ["dimension id", "dimension name"]:
+        return "dimensions"
+    if cells[:2] == ["dimension id", "member name"]:
+        return "members"
+    return "other"
+
+def parse_metadata_csv(file) -> dict:
+    """
+    Parses the *_MetaData.csv of a StatCan table ZIP.
+    The file is several CSV tables one after the other (cube info, dimensions, members, footnotes, ...)
+    separated by blank lines, each with its own header.
+
+    Parameters:
+        file (str | file-like): Path of the MetaData CSV, or an open binary/text file (Ex: from a ZipFile)
+
+    Returns:
+        dict: {
+            "product_id": int | None,
+            "title": str | None,
+            "dimensions": [
+                {
+                    "id": int,                # Position in COORDINATE (1 = first)
+                    "name": str,              # Column name in the data CSV (Ex: "Farm type")
+                    "members": [{"id": int, "name": str, "code": str, "parent": int | None}]
+                }
+            ]
+        }
+    """
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            return parse_metadata_csv(f)
+    if not isinstance(file, io.TextIOBase):
+        file = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+    metadata = {"product_id": None, "title": None, "dimensions": []}
+    dimensions = {}
+    section = header = None
+
+    for row in csv.reader(file):
+        # A blank line ends the current section, the next row is the header of another one
+        if not any(cell.strip() for cell in row):
+            section = None
+            continue
+        if section is None:
+            section, header = _section_of(row), [cell.strip().lower() for cell in row]
+            continue
+
+        values = dict(zip(header, row))
+        if section == "cube" and metadata["title"] is None:
+            metadata["title"] = values.get("cube title")
+            product_id = values.get("product id", "").strip()
+            metadata["product_id"] = int(product_id) if product_id.isdigit() else None
+        elif section == "dimensions":
+            dimension_id = int(values["dimension id"])
+            dimensions[dimension_id] = {"id": dimension_id, "name": values["dimension name"].strip(), "members": []}
+        elif section == "members":
+            dimension = dimensions.get(int(values["dimension id"]))
+            if dimension is None:
+                continue
+            parent = values.get("parent member id", "").strip()
+            dimension["members"].append({
+                "id": int(values["member id"]),
+                "name": values["member name"].strip(),
+                "code": values.get("classification code", "").strip(),
+                "parent": int(parent) if parent.isdigit() else None,
+            })
+
+    metadata["dimensions"] = [dimensions[key] for key in sorted(dimensions)]
+    return metadata
+
+def get_index_path(table_path: str) -> str:
+    """Path of the dimension index of a table, whatever its storage format"""
+    return os.path.splitext(table_path)[0] + INDEX_SUFFIX
+
+def save_dimension_index(metadata: dict, table_paths: list):
+    """Saves a parsed MetaData CSV next to each of the given tables (Ex: one per geography)"""
+    content = json.dumps(metadata, ensure_ascii=False)
+    for table_path in table_paths:
+        path = get_index_path(table_path)
+        with open(partial_path(path), "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(partial_path(path), path)
+
+class DimensionIndex:
+    """
+    Dimension/member index of a StatCan table, built from its MetaData CSV.
+    Resolves item names to member IDs once, so values can be found by exact member instead of
+    scanning every row of the table for keywords.
+    """
+    def __init__(self, metadata: dict):
+        self.product_id = metadata.get("product_id")
+        self.title = metadata.get("title")
+        self.dimensions = metadata.get("dimensions", [])
+        self._by_name = {normalize_name(d["name"]): d for d in self.dimensions}
+        self._resolved = {}
+
+    def get_dimension(self, name: str):
+        """Returns the dimension for a data CSV column (Ex: "Farm type"), or None"""
+        return self._by_name.get(normalize_name(name))
+
+    def find_members(self, dimension_name: str, name_keywords: list) -> list:
+        """
+        Members of a dimension whose name contains all keywords (punctuation/case ignored),
+        in the same order as the MetaData CSV. Results are remembered for the next lookup.
+
+        Returns:
+            list[dict] | None: Matching members, or None if the table has no such dimension
+        """
+        key = (normalize_name(dimension_name), tuple(name_keywords))
+        if key not in self._resolved:
+            dimension = self.get_dimension(dimension_name)
+            if dimension is None:
+                return None
+            keywords = [normalize_name(keyword) for keyword in name_keywords]
+            self._resolved[key] = [
+                member for member in dimension["members"]
+                if all(keyword in normalize_name(member["name"]) for keyword in keywords)
+            ]
+        return self._resolved[key]
+
+@lru_cache(maxsize=64)
+def _load_index(path: str, modified: float) -> DimensionIndex:
+    with open(path, "r", encoding="utf-8") as f:
+        return DimensionIndex(json.load(f))
+
+def load_dimension_index(table_path: str):
+    """
+    Returns the DimensionIndex saved next to a table, or None if it has none (Ex: tables from an older version).
+    Indexes stay in memory until the file changes, so repeated lookups in the same table skip the disk.
+    """
+    path = get_index_path(table_path)
+    try:
+        return _load_index(path, os.path.getmtime(path))
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        return None
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from datetime import datetime
+from utils.get_data_path import get_data_path
+from utils.table_storage import is_table_verified
+
+class DownloadManifest:
+    """
+    Class to track which StatCan tables have already been downloaded, and from which release,
+    so unchanged tables can be skipped on the next download.
+
+    Each entry is keyed by product ID:
+        {
+            "release_time": "2022-05-11T08:30",  # releaseTime from the cube list
+            "etag": str | None,                  # HTTP validators of the table ZIP
+            "last_modified": str | None,
+            "output_file": str | list[str],
+            "filters": dict,
+            "downloaded_at": "2025-08-13T10:00:00"
+        }
+    """
+    def __init__(self, filename="download_manifest.json", folder="data"):
+        self.filename = get_data_path(filename, folder)
+        self.data = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the manifest from file, starting empty if missing/corrupted"""
+        if not os.path.exists(self.filename):
+            self.data = {}
+            return
+
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            self.data = {}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(self.filename, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+
+    def get(self, table_id):
+        return self.data.get(str(table_id))
+
+    def get_validators(self, table_id) -> dict:
+        """Returns the stored ETag/Last-Modified of a table ZIP ({} if none)"""
+        entry = self.get(table_id) or {}
+        return {k: entry[k] for k in ("etag", "last_modified") if entry.get(k)}
+
+    def matches(self, table_id, output_file, filters, check_hash: bool = False) -> bool:
+        """
+        True if the table was last downloaded to output_file (a path, or a list of paths
+        for multi-geography downloads) with the same filters, and the file(s) are still complete
+        and unchanged according to their sidecar (see table_storage.commit_table).
+        Size and modification time are enough by default, check_hash also compares the SHA-256 of every file.
+        """
+        entry = self.get(table_id)
+        if not entry:
+            return False
+
+        paths = [output_file] if isinstance(output_file, str) else list(output_file)
+        return (
+            entry.get("output_file") == output_file
+            and entry.get("filters") == filters
+            and all(is_table_verified(path, check_hash) for path in paths)
+        )
+
+    def is_fresh(self, table_id, release_time, output_file, filters, check_hash: bool = False) -> bool:
+        """
+        True if the table was already downloaded to output_file with the same filters
+        from the same StatCan release, and the file is still intact.
+        """
+        if not release_time or not self.matches(table_id, output_file, filters, check_hash):
+            return False
+        return self.get(table_id).get("release_time") == release_time
+
+    def record(self, table_id, release_time, output_file, filters, validators=None):
+        """Saves a successful download to the manifest"""
+        validators = validators or {}
+        entry = {
+            "release_time": release_time,
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last_modified"),
+            "output_file": output_file,
+            "filters": filters,
+            "downloaded_at": datetime.now().isoformat(timespec="seconds")
+        }
+        # Tables finish on several threads at once
+        with self._lock:
+            self.data[str(table_id)] = entry
+        self.save()
@@ -0,0 +1,177 @@
+import re
+import numpy as np
+import pandas as pd
+# pyarrow is optional. It is only needed to filter pyarrow tables and record batches
+from utils.read_statcan_csv import pyarrow
+
+def _column_names(table) -> list:
+    """Column names of a DataFrame or a pyarrow Table/RecordBatch"""
+    return table.column_names if hasattr(table, "column_names") else list(table.columns)
+
+def _column_values(table, column: str):
+    """
+    Returns (values, codes) for a column. Categorical and dictionary encoded columns return their
+    categories and the code of each row (-1 when missing), anything else returns (series, None).
+    """
+    if isinstance(table, pd.DataFrame):
+        series = table[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return pd.Series(series.cat.categories), series.cat.codes.to_numpy()
+        return series, None
+
+    array = table.column(column)
+    if isinstance(array, pyarrow.ChunkedArray):
+        array = array.combine_chunks()
+    if pyarrow.types.is_dictionary(array.type):
+        return array.dictionary.to_pandas(), array.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+    return array.to_pandas(), None
+
+class FilterExpression:
+    """
+    Compiles a table filter into a single boolean mask, so a table (or chunk) is filtered with one
+    indexing operation and no intermediate copies.
+
+    A filter is a dict of {column: condition}. Every entry must match (AND). A condition is one of:
+        ["A", "B"]                      → value is in the list (the original filter format)
+        "A"                             → value equals "A"
+        {"eq": "A"}                     → value equals "A"
+        {"in": ["A", "B"]}              → value is in the list
+        {"prefix": "Division No."}      → text starts with the prefix
+        {"regex": r", Alberta \\["}      → text contains a match of the regular expression
+        {"range": [2016, 2021]}         → number between the bounds, inclusive. Use None for an open bound
+        {"not": condition}              → condition does not match
+    A condition dict with several keys must match all of them.
+
+    "and", "or" and "not" keys combine whole filters:
+        {"or": [{"GEO": {"prefix": "Alberta"}}, {"GEO": {"regex": ", Alberta \\["}}]}
+        {"GEO": {"regex": ", Alberta \\["}, "not": {"Farm type": ["Total farms"]}}
+
+    Conditions on columns missing from the table are skipped, the same as the original filters.
+    Masks can be built for pandas DataFrames and for pyarrow Tables/RecordBatches, so rows can be
+    filtered before they are converted to pandas.
+    """
+    COMBINATORS = ("and", "or", "not")
+
+    def __init__(self, filters: dict):
+        self.filters = filters or {}
+        self.columns = set()
+        self._predicate = self._compile(self.filters)
+
+    def mask(self, df) -> np.ndarray:
+        """Returns the boolean mask of the rows of df (a DataFrame or pyarrow Table/RecordBatch) matching the filter"""
+        mask = self._predicate(df)
+        return np.ones(len(df), dtype=bool) if mask is None else mask
+
+    def missing_columns(self, df) -> list:
+        """Columns used by the filter that df does not have"""
+        names = _column_names(df)
+        return sorted(column for column in self.columns if column not in names)
+
+    # --- Compiling ---
+
+    def _compile(self, expression):
+        if isinstance(expression, list):
+            return self._all([self._compile(part) for part in expression])
+        if not isinstance(expression, dict):
+            raise ValueError(f"Invalid filter: {expression!r}. Expected a dict of {{column: condition}}")
+
+        parts = []
+        for key, value in expression.items():
+            if key == "and":
+                parts.append(self._all([self._compile(part) for part in value]))
+            elif key == "or":
+                parts.append(self._any([self._compile(part) for part in value]))
+            elif key == "not":
+                parts.append(self._negate(self._compile(value)))
+            else:
+                self.columns.add(key)
+                parts.append(self._compile_condition(key, value))
+        return self._all(parts)
+
+    def _compile_condition(self, column: str, condition):
+        if isinstance(condition, (list, tuple, set)):
+            condition = {"in": list(condition)}
+        elif not isinstance(condition, dict):
+            condition = {"eq": condition}
+
+        parts = []
+        for op, argument in condition.items():
+            if op == "not":
+                parts.append(self._negate(self._compile_condition(column, argument)))
+            elif op == "eq":
+                parts.append(self._leaf(column, lambda values, argument=argument: values == argument))
+            elif op == "in":
+                parts.append(self._leaf(column, lambda values, argument=list(argument): values.isin(argument)))
+            elif op == "prefix":
+                parts.append(self._leaf(column, lambda values, argument=str(argument): values.astype(str).str.startswith(argument)))
+            elif op == "regex":
+                pattern = re.compile(argument)
+                parts.append(self._leaf(column, lambda values, pattern=pattern: values.astype(str).str.contains(pattern)))
+            elif op == "range":
+                low, high = argument
+                parts.append(self._leaf(column, lambda values, low=low, high=high: self._in_range(values, low, high)))
+            else:
+                raise ValueError(f"Unknown filter operator '{op}' on column '{column}'")
+        return self._all(parts)
+
+    @staticmethod
+    def _in_range(values: pd.Series, low, high) -> pd.Series:
+        numbers = pd.to_numeric(values, errors="coerce")
+        mask = numbers.notna()
+        if low is not None:
+            mask &= numbers >= low
+        if high is not None:
+            mask &= numbers <= high
+        return mask
+
+    # --- Evaluating ---
+
+    @staticmethod
+    def _leaf(column: str, test):
+        """
+        Wraps a vectorized test of a column. Categorical columns are tested once per category
+        instead of once per row. Missing values never match.
+        """
+        def predicate(df):
+            if column not in _column_names(df):
+                return None
+            series, codes = _column_values(df, column)
+
+            if codes is not None:
+                category_mask = np.asarray(test(series), dtype=bool)
+                # Code -1 (missing) picks the extra False at the end
+                return np.append(category_mask, False)[codes]
+
+            mask = np.zeros(len(series), dtype=bool)
+            present = series.notna().to_numpy()
+            mask[present] = np.asarray(test(series[present]), dtype=bool)
+            return mask
+        return predicate
+
+    @staticmethod
+    def _all(parts: list):
+        """AND of parts. Skipped (None) parts do not restrict anything"""
+        if len(parts) == 1:
+            return parts[0]
+
+        def predicate(df):
+            masks = [mask for mask in (part(df) for part in parts) if mask is not None]
+            return np.logical_and.reduce(masks) if masks else None
+        return predicate
+
+    @staticmethod
+    def _any(parts: list):
+        """OR of parts. A skipped (None) part matches every row"""
+        def predicate(df):
+            masks = [part(df) for part in parts]
+            if not masks or any(mask is None for mask in masks):
+                return None
+            return np.logical_or.reduce(masks)
+        return predicate
+
+    @staticmethod
+    def _negate(part):
+        def predicate(df):
+            mask = part(df)
+            return None if mask is None else ~mask
+        return predicate
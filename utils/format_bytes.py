@@ -0,0 +1,7 @@
+def format_bytes(num_bytes):
+    """Format a byte count as a short human readable string (Ex: 12.3 MB)."""
+    size = float(num_bytes or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
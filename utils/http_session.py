@@ -0,0 +1,186 @@
+import os
+import random
+import threading
+import time
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from utils.rate_limiter import TokenBucket
+
+# Base URL of the StatCan Web Data Service
+WDS_URL = "https://www150.statcan.gc.ca/t1/wds/rest"
+
+# Set STATCAN_WDS_URL to point every WDS call at another server (Ex: the stand-in in scripts/wds_stand_in.py)
+_wds_url = os.environ.get("STATCAN_WDS_URL", WDS_URL).rstrip("/")
+
+# Responses worth retrying. Anything else (Ex: 404) fails straight away
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Retries after the first attempt
+MAX_RETRIES = 3
+
+# Exponential backoff: a random delay up to BACKOFF_BASE * 2^attempt seconds, capped at BACKOFF_MAX
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+
+# Connections kept alive per host
+POOL_SIZE = 16
+
+# StatCan allows up to 25 requests per second per server. Stay under it across every worker thread
+REQUESTS_PER_SECOND = 20
+REQUEST_BURST = 5
+
+rate_limiter = TokenBucket(rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST)
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+# Called with (method, url, kwargs, response) after every request (Ex: to record fixtures)
+_request_hook = None
+
+def get_wds_url() -> str:
+    """Returns the WDS base URL every StatCan call is sent to"""
+    return _wds_url
+
+def set_wds_url(url: str = None):
+    """Points every following WDS call at url. None restores STATCAN_WDS_URL or the real StatCan server"""
+    global _wds_url
+    _wds_url = (url or os.environ.get("STATCAN_WDS_URL", WDS_URL)).rstrip("/")
+
+def set_request_hook(hook):
+    """Installs a function called with (method, url, kwargs, response) after every request. None removes it"""
+    global _request_hook
+    _request_hook = hook
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared requests session used for every StatCan call.
+    Reusing it keeps connections alive so each request skips the TCP + TLS handshake.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+def _endpoint_name(url: str) -> str:
+    """Groups stats by WDS method (Ex: getCubeMetadata) or by host for anything else (Ex: ZIP downloads)"""
+    parsed = urlparse(url)
+    parts = parsed.path.split("/")
+    if "rest" in parts and parts.index("rest") + 1 < len(parts):
+        return parts[parts.index("rest") + 1]
+    return parsed.netloc
+
+def record_request(url: str, elapsed: float, retries: int, failed: bool):
+    """Adds one request to the timing stats"""
+    with _stats_lock:
+        entry = _stats.setdefault(_endpoint_name(url), {
+            "requests": 0, "retries": 0, "failures": 0, "total_time": 0.0, "max_time": 0.0
+        })
+        entry["requests"] += 1
+        entry["retries"] += retries
+        entry["failures"] += int(failed)
+        entry["total_time"] += elapsed
+        entry["max_time"] = max(entry["max_time"], elapsed)
+
+def backoff_delay(attempt: int, headers=None) -> float:
+    """Full jitter backoff, honouring Retry-After when StatCan sends one"""
+    if headers is not None and str(headers.get("Retry-After", "")).isdigit():
+        return min(float(headers["Retry-After"]), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def statcan_request(method: str, url: str, max_retries: int = MAX_RETRIES, stop_event: threading.Event = None, **kwargs) -> requests.Response:
+    """
+    Sends a request through the shared session, retrying connection errors, timeouts
+    and retryable status codes with exponential backoff and jitter.
+    Every request waits its turn on the shared rate_limiter.
+
+    Parameters:
+        method (str): HTTP method (Ex: "GET")
+        url (str): URL to request
+        max_retries (int): Retries after the first attempt
+        stop_event (threading.Event, optional): Stops waiting for a retry when set
+        **kwargs: Passed to requests.Session.request (Ex: timeout, json, stream, headers)
+
+    Returns:
+        requests.Response: The last response. Status codes are not raised, call raise_for_status
+
+    Raises:
+        requests.exceptions.RequestException: If every attempt failed to get a response
+    """
+    session = get_session()
+    start = time.perf_counter()
+    attempt = 0
+
+    while True:
+        response = None
+
+        # Every attempt, retries included, counts against the shared rate limit
+        if not rate_limiter.acquire(stop_event):
+            record_request(url, time.perf_counter() - start, attempt, failed=True)
+            raise requests.exceptions.RequestException("Request stopped by user.")
+
+        try:
+            response = session.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                record_request(url, time.perf_counter() - start, attempt, failed=not response.ok)
+                if _request_hook:
+                    _request_hook(method, url, kwargs, response)
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= max_retries:
+                record_request(url, time.perf_counter() - start, attempt, failed=True)
+                raise
+
+        delay = backoff_delay(attempt, response.headers if response is not None else None)
+        if response is not None:
+            response.close()
+        attempt += 1
+
+        # Waiting on the event lets a cancel interrupt the backoff
+        if stop_event is not None:
+            if stop_event.wait(delay):
+                record_request(url, time.perf_counter() - start, attempt, failed=True)
+                raise requests.exceptions.RequestException("Request stopped by user.")
+        else:
+            time.sleep(delay)
+
+def statcan_get(url: str, **kwargs) -> requests.Response:
+    return statcan_request("GET", url, **kwargs)
+
+def statcan_post(url: str, **kwargs) -> requests.Response:
+    return statcan_request("POST", url, **kwargs)
+
+def statcan_head(url: str, **kwargs) -> requests.Response:
+    return statcan_request("HEAD", url, **kwargs)
+
+def get_request_stats() -> dict:
+    """
+    Returns timing stats per endpoint since the last reset.
+    For streamed downloads the time covers the response headers, not the body.
+
+    Returns:
+        dict: {
+            "getCubeMetadata": {
+                "requests": int, "retries": int, "failures": int,
+                "total_time": float, "max_time": float, "avg_time": float   # seconds
+            },
+            ...
+        }
+    """
+    with _stats_lock:
+        return {
+            name: {**entry, "avg_time": entry["total_time"] / entry["requests"] if entry["requests"] else 0.0}
+            for name, entry in _stats.items()
+        }
+
+def reset_request_stats():
+    with _stats_lock:
+        _stats.clear()
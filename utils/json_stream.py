@@ -0,0 +1,83 @@
+import codecs
+import json
+
+# Characters allowed between the values of a JSON array
+_SEPARATORS = " \t\r\n,"
+
+# Consumed text is dropped from the buffer once it grows past this many characters
+_COMPACT_AT = 1024 * 1024
+
+def iter_json_array(chunks, fields: tuple = None):
+    """
+    Yields the values of a top-level JSON array one at a time while it is still arriving,
+    so the whole payload (Ex: StatCan's cube list) is never held in memory or parsed at once.
+
+    Parameters:
+        chunks (iterable[bytes]): UTF-8 pieces of the JSON document (Ex: response.iter_content(64 * 1024))
+        fields (tuple[str], optional): Only keep these keys of each object
+
+    Yields:
+        Each value of the array, objects reduced to fields when given
+
+    Raises:
+        ValueError: If the document is not a JSON array or is cut short
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    finished = False
+    started = False
+
+    def read_more() -> bool:
+        nonlocal buffer, finished
+        if finished:
+            return False
+        for chunk in chunks:
+            if chunk:
+                buffer += text_decoder.decode(chunk)
+                return True
+        buffer += text_decoder.decode(b"", final=True)
+        finished = True
+        return False
+
+    while True:
+        # Step 1: Skip to the next value, or the end of the array
+        while position < len(buffer) and buffer[position] in (_SEPARATORS if started else " \t\r\n"):
+            position += 1
+        if position >= len(buffer):
+            if not read_more():
+                raise ValueError("JSON array ended early")
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError(f"Expected a JSON array, found {buffer[position]!r}")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+
+        # Step 2: Decode one value, reading more when it is still incomplete
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not read_more():
+                raise ValueError("JSON array ended early or is invalid")
+            continue
+
+        # A number at the very end of the buffer may still have digits coming
+        if end == len(buffer) and not finished and not isinstance(value, (dict, list, str)):
+            read_more()
+            continue
+
+        position = end
+        if position > _COMPACT_AT:
+            buffer = buffer[position:]
+            position = 0
+
+        if fields is not None and isinstance(value, dict):
+            value = {key: value[key] for key in fields if key in value}
+        yield value
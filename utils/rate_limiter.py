@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill at `rate` per second up to `capacity`. Each request takes one token,
+    so bursts of up to `capacity` go straight through and the long run average stays at `rate`.
+    """
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _try_take(self) -> float:
+        """Takes a token if one is available. Returns 0, or the seconds to wait for the next token"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop_event: threading.Event = None) -> bool:
+        """
+        Blocks until a token is available.
+
+        Returns:
+            bool: True once a token was taken, False if stop_event was set while waiting
+        """
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return True
+
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Waits on the event loop until a token is available.
+        Shares its tokens with acquire, so threaded and async requests count against the same limit.
+        """
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from utils.get_data_path import get_data_path
+
+# Default disk budget for cached table ZIPs
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+class RawTableCache:
+    """
+    Content-addressed cache of raw StatCan table ZIPs kept under data/cache.
+
+    ZIPs are stored once by the SHA-256 of their content in objects/<hash>.zip, and index.json maps
+    "<product_id>@<release>" keys to those hashes. When the cache grows past max_bytes the least
+    recently used ZIPs are evicted.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MAX_BYTES, folder="data/cache"):
+        self.max_bytes = max_bytes
+        self.folder = get_data_path("", folder)
+        self.objects_folder = get_data_path("", os.path.join(folder, "objects"))
+        self.index_file = os.path.join(self.folder, "index.json")
+        self._lock = threading.Lock()
+        self.index = {"keys": {}, "objects": {}}
+        self.load()
+
+    @staticmethod
+    def make_key(product_id, release) -> str:
+        return f"{product_id}@{release}"
+
+    def load(self):
+        """Load the index from file, starting empty if missing/corrupted"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            self.index = {"keys": {}, "objects": {}}
+
+    def save(self):
+        with open(self.index_file, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_folder, f"{digest}.zip")
+
+    def get(self, product_id, release):
+        """
+        Returns the path of the cached ZIP for a table release, or None if it is not cached.
+        Marks the ZIP as recently used.
+        """
+        if not release:
+            return None
+
+        with self._lock:
+            digest = self.index["keys"].get(self.make_key(product_id, release))
+            if not digest or digest not in self.index["objects"]:
+                return None
+
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                # Removed from disk behind our back, forget it
+                del self.index["objects"][digest]
+                self.save()
+                return None
+
+            self.index["objects"][digest]["last_used"] = time.time()
+            self.save()
+            return path
+
+    def put(self, product_id, release, file_obj):
+        """
+        Copies a downloaded ZIP (any readable binary file object) into the cache and evicts
+        old entries if the cache is over budget. file_obj is rewound afterwards.
+
+        Returns:
+            str | None: Path of the cached ZIP, or None if release is unknown
+        """
+        if not release:
+            return None
+
+        # Hash while copying so the ZIP is only read once
+        sha = hashlib.sha256()
+        size = 0
+        file_obj.seek(0)
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_folder, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: file_obj.read(1024 * 1024), b""):
+                    sha.update(block)
+                    out.write(block)
+                    size += len(block)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        finally:
+            file_obj.seek(0)
+
+        digest = sha.hexdigest()
+        path = self._object_path(digest)
+
+        with self._lock:
+            # Identical content is only stored once
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+
+            self.index["objects"][digest] = {"size": size, "last_used": time.time()}
+            self.index["keys"][self.make_key(product_id, release)] = digest
+            self._evict()
+            self.save()
+
+        return path if os.path.exists(path) else None
+
+    def total_bytes(self) -> int:
+        return sum(obj["size"] for obj in self.index["objects"].values())
+
+    def _evict(self):
+        """Removes least recently used ZIPs until the cache fits in max_bytes. Caller holds the lock."""
+        by_age = sorted(self.index["objects"].items(), key=lambda item: item[1]["last_used"])
+        total = self.total_bytes()
+
+        for digest, obj in by_age:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still open elsewhere (Ex: PermissionError on Windows), keep it and try again next eviction
+                continue
+            del self.index["objects"][digest]
+            total -= obj["size"]
+
+        # Drop keys pointing at evicted objects
+        self.index["keys"] = {k: d for k, d in self.index["keys"].items() if d in self.index["objects"]}
+
+    def clear(self):
+        """Removes every cached ZIP"""
+        with self._lock:
+            shutil.rmtree(self.objects_folder, ignore_errors=True)
+            os.makedirs(self.objects_folder, exist_ok=True)
+            self.index = {"keys": {}, "objects": {}}
+            self.save()
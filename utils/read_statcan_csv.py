@@ -0,0 +1,144 @@
+import csv
+from collections import defaultdict
+import pandas as pd
+
+# pyarrow is optional. Without it CSVs are parsed by the pandas C parser, tables are stored as pickle
+# (see table_storage) and filters only run on DataFrames. Every module imports pyarrow from here
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Columns of StatCan full table CSVs the wizard never reads
+UNUSED_COLUMNS = {"DGUID", "UOM_ID", "SCALAR_FACTOR", "SCALAR_ID", "VECTOR", "COORDINATE", "SYMBOL", "TERMINATED", "DECIMALS"}
+
+# Columns parsed as numbers. Every other column (REF_DATE, GEO, the dimension columns, UOM, STATUS)
+# repeats a handful of strings over thousands of rows, so it is stored as a categorical
+NUMERIC_COLUMNS = {"VALUE": "float64"}
+
+# CSV parsers that can read a table. "auto" picks pyarrow when it is installed
+CSV_ENGINES = ("auto", "pyarrow", "pandas")
+
+# Bytes of CSV text parsed per pyarrow record batch when streaming
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Rows read when comparing the lean load against a plain pd.read_csv
+MEMORY_SAMPLE_ROWS = 10_000
+
+def lean_read_options(keep_columns=(), columns: list = None) -> dict:
+    """
+    Returns the pd.read_csv keyword arguments for a lean StatCan load.
+
+    Parameters:
+        keep_columns (iterable[str]): Columns to load even if they are normally dropped (Ex: filter columns)
+        columns (list[str], optional): Only load exactly these columns
+
+    Returns:
+        dict: {"usecols": ..., "dtype": ...}
+    """
+    keep_columns = set(keep_columns)
+    if columns is not None:
+        usecols = columns
+    else:
+        usecols = lambda column: column not in UNUSED_COLUMNS or column in keep_columns
+    return {"usecols": usecols, "dtype": defaultdict(lambda: "category", NUMERIC_COLUMNS)}
+
+def read_statcan_csv(csv_file, keep_columns=(), columns: list = None, **kwargs):
+    """
+    Reads a StatCan table CSV with only the columns the wizard uses and categorical string columns.
+    Takes a fraction of the memory of a plain pd.read_csv.
+
+    Parameters:
+        csv_file (str | file-like): CSV to read (Ex: an open file from a ZipFile)
+        keep_columns (iterable[str]): Columns to load even if they are normally dropped
+        columns (list[str], optional): Only load exactly these columns
+        **kwargs: Passed to pd.read_csv (Ex: chunksize, nrows)
+
+    Returns:
+        pd.DataFrame, or a reader of DataFrames when chunksize is given
+    """
+    return pd.read_csv(csv_file, **lean_read_options(keep_columns, columns), **kwargs)
+
+def resolve_csv_engine(csv_engine: str) -> str:
+    """Turns "auto" into the fastest available CSV parser and checks the parser is usable"""
+    if csv_engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{csv_engine}'. Expected one of: {', '.join(CSV_ENGINES)}")
+    if csv_engine == "auto":
+        return "pyarrow" if pyarrow is not None else "pandas"
+    if csv_engine == "pyarrow" and pyarrow is None:
+        raise ImportError("The pyarrow CSV engine needs pyarrow (python -m pip install pyarrow)")
+    return csv_engine
+
+def _read_header(csv_file) -> list:
+    """Reads the column names from the first line of a CSV path or seekable binary file"""
+    if isinstance(csv_file, str):
+        with open(csv_file, "rb") as f:
+            line = f.readline()
+    else:
+        line = csv_file.readline()
+        csv_file.seek(0)
+    # StatCan CSVs start with a UTF-8 byte order mark
+    return next(csv.reader([line.decode("utf-8-sig")]))
+
+def read_statcan_csv_arrow(csv_file, keep_columns=(), stream: bool = False, block_size: int = ARROW_BLOCK_SIZE):
+    """
+    Reads a StatCan table CSV with pyarrow's multithreaded parser, with the same column pruning as read_statcan_csv.
+    String columns are dictionary encoded, so they become categoricals when converted with to_pandas.
+
+    Parameters:
+        csv_file (str | file-like): CSV to read. File objects must be binary and seekable (Ex: an open file from a ZipFile)
+        keep_columns (iterable[str]): Columns to load even if they are normally dropped
+        stream (bool): Return a reader of record batches instead of the whole table
+        block_size (int): Bytes of CSV text parsed per record batch
+
+    Returns:
+        pyarrow.Table, or a pyarrow.csv.CSVStreamingReader when stream is True
+    """
+    keep_columns = set(keep_columns)
+    columns = [column for column in _read_header(csv_file) if column not in UNUSED_COLUMNS or column in keep_columns]
+    column_types = {
+        column: pyarrow.type_for_alias(NUMERIC_COLUMNS[column]) if column in NUMERIC_COLUMNS
+        else pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        for column in columns
+    }
+
+    read_options = pyarrow_csv.ReadOptions(use_threads=True, block_size=block_size)
+    convert_options = pyarrow_csv.ConvertOptions(include_columns=columns, column_types=column_types)
+    if stream:
+        return pyarrow_csv.open_csv(csv_file, read_options=read_options, convert_options=convert_options)
+    return pyarrow_csv.read_csv(csv_file, read_options=read_options, convert_options=convert_options)
+
+def measure_memory_savings(csv_file, nrows: int = MEMORY_SAMPLE_ROWS) -> dict:
+    """
+    Compares the memory of the first nrows rows loaded plainly and with read_statcan_csv.
+
+    Parameters:
+        csv_file (str | file-like): CSV to measure. File objects must be seekable and are rewound afterwards
+        nrows (int): Rows to sample
+
+    Returns:
+        dict: {
+            "naive_bytes": int,
+            "lean_bytes": int,
+            "saved_bytes": int,
+            "saved_ratio": float   # Fraction of the plain load saved (Ex: 0.8)
+        }
+    """
+    sizes = []
+    for reader in (pd.read_csv, read_statcan_csv):
+        if hasattr(csv_file, "seek"):
+            csv_file.seek(0)
+        sizes.append(int(reader(csv_file, nrows=nrows).memory_usage(deep=True).sum()))
+    if hasattr(csv_file, "seek"):
+        csv_file.seek(0)
+
+    naive_bytes, lean_bytes = sizes
+    return {
+        "naive_bytes": naive_bytes,
+        "lean_bytes": lean_bytes,
+        "saved_bytes": naive_bytes - lean_bytes,
+        "saved_ratio": (naive_bytes - lean_bytes) / naive_bytes if naive_bytes else 0.0
+    }
@@ -0,0 +1,245 @@
+import csv
+import hashlib
+import json
+import os
+import pandas as pd
+from datetime import datetime
+# pyarrow is optional. Without it tables fall back to pickle, which pandas can always read
+from utils.read_statcan_csv import read_statcan_csv, pyarrow
+
+# File extension of each storage format
+TABLE_FORMATS = {
+    "csv": ".csv",
+    "feather": ".feather",
+    "parquet": ".parquet",
+    "pickle": ".pkl",
+}
+
+# When several formats of the same table exist, the first one found in this order is read
+READ_PREFERENCE = [".feather", ".parquet", ".pkl", ".csv"]
+
+# Tables are written to "<path>.partial" and only renamed to their final path once complete
+PARTIAL_SUFFIX = ".partial"
+
+# Sidecar saved next to every complete table (Ex: farm_type_2021.feather.meta.json)
+SIDECAR_SUFFIX = ".meta.json"
+
+def get_default_format() -> str:
+    """Feather when pyarrow is installed, otherwise pickle"""
+    return "feather" if pyarrow is not None else "pickle"
+
+def resolve_format(storage_format: str) -> str:
+    """Turns "auto" into the best available format and checks the format is usable"""
+    if storage_format == "auto":
+        return get_default_format()
+    if storage_format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown storage format '{storage_format}'. Expected one of: auto, {', '.join(TABLE_FORMATS)}")
+    if storage_format in ("feather", "parquet") and pyarrow is None:
+        raise ImportError(f"The {storage_format} format needs pyarrow (python -m pip install pyarrow)")
+    return storage_format
+
+def is_table_file(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in READ_PREFERENCE
+
+def partial_path(path: str) -> str:
+    """Path a table is written to before it is complete. Never picked up by is_table_file"""
+    return path + PARTIAL_SUFFIX
+
+def sidecar_path(path: str) -> str:
+    return path + SIDECAR_SUFFIX
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def count_table_rows(path: str, extension: str = None) -> int:
+    """
+    Counts the data rows of a saved table without keeping it in memory.
+
+    Parameters:
+        path (str): Path of the table
+        extension (str, optional): Format of the file (Ex: ".feather"). Taken from path when not given,
+            needed for partial files
+    """
+    extension = (extension or os.path.splitext(path)[1]).lower()
+
+    if extension == ".feather":
+        return pyarrow.feather.read_table(path, columns=[], memory_map=True).num_rows
+    if extension == ".parquet":
+        return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+    if extension == ".pkl":
+        return len(pd.read_pickle(path))
+
+    # csv.reader so quoted values containing newlines count as one row
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+def _fsync_folder(folder: str):
+    """Makes a rename durable. Not supported on Windows, where the rename is already durable"""
+    try:
+        fd = os.open(folder or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def commit_table(temp_path: str, path: str, expected_rows: int = None) -> dict:
+    """
+    Atomically replaces path with a fully written temp_path and records a sidecar for it.
+    The temp file is flushed to disk and its row count checked first, so path is either the
+    previous complete table or the new complete table, never a truncated one.
+
+    Parameters:
+        temp_path (str): Complete table, usually partial_path(path)
+        path (str): Final path of the table
+        expected_rows (int, optional): Rows that were written. The temp file is removed and an IOError raised if it holds a different number
+
+    Returns:
+        dict: The sidecar { "rows": int, "bytes": int, "mtime": float, "sha256": str, "written_at": str }
+    """
+    # Step 1: Flush the written data to disk
+    with open(temp_path, "rb+") as f:
+        os.fsync(f.fileno())
+
+    # Step 2: Verify the file holds every row
+    rows = count_table_rows(temp_path, os.path.splitext(path)[1])
+    if expected_rows is not None and rows != expected_rows:
+        os.remove(temp_path)
+        raise IOError(f"{os.path.basename(path)}: wrote {expected_rows} rows but the file holds {rows}")
+
+    sidecar = {
+        "rows": rows,
+        "bytes": os.path.getsize(temp_path),
+        "sha256": file_sha256(temp_path),
+        "written_at": datetime.now().isoformat(timespec="seconds")
+    }
+
+    # Step 3: Rename over the old table, then record the sidecar the same way.
+    # A crash in between leaves a table without a sidecar, which is simply not trusted
+    os.replace(temp_path, path)
+    _fsync_folder(os.path.dirname(path))
+    # The rename keeps the modification time, recorded so unchanged tables are recognized without hashing them
+    sidecar["mtime"] = os.path.getmtime(path)
+
+    temp_sidecar = partial_path(sidecar_path(path))
+    with open(temp_sidecar, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_sidecar, sidecar_path(path))
+    return sidecar
+
+def read_sidecar(path: str):
+    """Returns the sidecar of a table, or None if it is missing/corrupted"""
+    try:
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def is_table_verified(path: str, check_hash: bool = True) -> bool:
+    """
+    True if path is a complete table written by commit_table and unchanged since.
+    Tables without a sidecar (Ex: saved by an older version) are not trusted.
+    Size and modification time are compared first, reading the whole file to hash it is only done when asked.
+
+    Parameters:
+        path (str): Path of the table
+        check_hash (bool): Also compare the SHA-256 of the file, not only its size and modification time
+    """
+    sidecar = read_sidecar(path)
+    if not sidecar:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != sidecar.get("bytes"):
+        return False
+    # Sidecars from before mtime was recorded only have the size to go on
+    if "mtime" in sidecar and stat.st_mtime != sidecar["mtime"]:
+        return False
+    return not check_hash or file_sha256(path) == sidecar.get("sha256")
+
+def remove_table(path: str):
+    """Removes a table along with its sidecar and any leftover partial file"""
+    for file in (path, sidecar_path(path), partial_path(path)):
+        if os.path.exists(file):
+            os.remove(file)
+
+def save_table(df: pd.DataFrame, path: str, storage_format: str = "auto") -> str:
+    """
+    Saves a table in the given format, replacing the extension of path to match.
+    The table is written to a partial file and committed with commit_table, so a crash never leaves a truncated table.
+
+    Returns:
+        str: The path actually written
+    """
+    storage_format = resolve_format(storage_format)
+    path = os.path.splitext(path)[0] + TABLE_FORMATS[storage_format]
+    temp_path = partial_path(path)
+
+    try:
+        if storage_format == "csv":
+            df.to_csv(temp_path, index=False)
+        elif storage_format == "feather":
+            df.reset_index(drop=True).to_feather(temp_path)
+        elif storage_format == "parquet":
+            df.to_parquet(temp_path, index=False)
+        else:
+            df.to_pickle(temp_path)
+        commit_table(temp_path, path, len(df))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+def load_table(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Loads a table saved by save_table (or a plain CSV), detecting the format from the extension.
+    CSVs are read with read_statcan_csv, so unused StatCan columns are dropped and strings are categorical.
+
+    Parameters:
+        path (str): Path of the table
+        columns (list[str], optional): Only load these columns (cheaper for the columnar formats)
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".feather":
+        return pd.read_feather(path, columns=columns)
+    if extension == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    if extension == ".pkl":
+        df = pd.read_pickle(path)
+        return df[columns] if columns else df
+    return read_statcan_csv(path, columns=columns)
+
+def convert_table(csv_path: str, storage_format: str = "auto") -> str:
+    """
+    Converts a downloaded CSV into the given storage format and removes the CSV.
+    Other stale formats of the same table (and their sidecars) are removed so readers never pick an old copy.
+
+    Returns:
+        str: Path of the converted table (csv_path itself if the format is csv)
+    """
+    storage_format = resolve_format(storage_format)
+    stem = os.path.splitext(csv_path)[0]
+
+    if storage_format != "csv":
+        new_path = save_table(read_statcan_csv(csv_path), csv_path, storage_format)
+    else:
+        new_path = csv_path
+
+    for extension in TABLE_FORMATS.values():
+        old_path = stem + extension
+        if old_path != new_path:
+            remove_table(old_path)
+    return new_path
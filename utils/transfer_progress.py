@@ -0,0 +1,86 @@
+import threading
+import time
+from utils.format_bytes import format_bytes
+
+# Minimum seconds between two progress reports, so a fast download does not flood the UI
+PROGRESS_INTERVAL = 0.25
+
+class TransferProgress:
+    """
+    Tracks the bytes received by a streamed download and reports them to a callback,
+    at most once every min_interval seconds (stage changes are always reported).
+
+    The callback receives a dict:
+        {
+            "stage": str,              # "downloading" or "filtering"
+            "bytes": int,              # Bytes received so far, including a resumed partial file
+            "total": int | None,       # Size of the file if the server sent it
+            "rate": float,             # Bytes per second received since the transfer (re)started
+            "eta": float | None        # Seconds left, if the total is known
+        }
+    """
+    def __init__(self, callback, min_interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.stage = "downloading"
+        self.bytes = 0
+        self.total = None
+        self._start_bytes = 0
+        self._start_time = time.monotonic()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, total: int = None, offset: int = 0):
+        """(Re)starts the transfer. offset is the size of a partial file being resumed"""
+        with self._lock:
+            self.stage = "downloading"
+            self.total = total
+            self.bytes = self._start_bytes = offset
+            self._start_time = time.monotonic()
+        self.report(force=True)
+
+    def update(self, num_bytes: int):
+        with self._lock:
+            self.bytes += num_bytes
+        self.report()
+
+    def set_stage(self, stage: str):
+        with self._lock:
+            self.stage = stage
+        self.report(force=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self._start_time
+            rate = (self.bytes - self._start_bytes) / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.total is not None and rate > 0:
+                eta = max(self.total - self.bytes, 0) / rate
+            return {"stage": self.stage, "bytes": self.bytes, "total": self.total, "rate": rate, "eta": eta}
+
+    def report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.min_interval:
+            return
+        self._last_report = now
+        if self.callback:
+            self.callback(self.snapshot())
+
+def format_duration(seconds: float) -> str:
+    """Format seconds as a short duration (Ex: 1m 25s)"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+def format_progress(progress: dict) -> str:
+    """Format a progress dict as a short status (Ex: 45.2 MB of 300.0 MB at 3.1 MB/s, 1m 25s left)"""
+    text = format_bytes(progress["bytes"])
+    if progress.get("total"):
+        text += f" of {format_bytes(progress['total'])}"
+    text += f" at {format_bytes(progress['rate'])}/s"
+    if progress.get("eta") is not None:
+        text += f", {format_duration(progress['eta'])} left"
+    return text